@@ -0,0 +1,76 @@
+import argparse
+import io
+import os
+import tarfile
+import tempfile
+import time
+from ShellEmulator import ShellEmulator
+
+#генерация архива с заданным числом элементов: директории по 100 файлов
+def generate_archive(path, entries):
+    with tarfile.open(path, "w") as tar:
+        for i in range(entries):
+            if i % 100 == 0:
+                info = tarfile.TarInfo(f"dir{i // 100}")
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+            else:
+                data = f"line{i % 7}\nline{i % 3}\n".encode("utf-8")
+                info = tarfile.TarInfo(f"dir{i // 100}/file{i}.txt")
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+#время создания эмулятора
+def measure(config):
+    start = time.perf_counter()
+    ShellEmulator(config)
+    return time.perf_counter() - start
+
+#холодный и теплый запуск с индексом архива
+def bench_startup(entries, mode):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tar_path = os.path.join(temp_dir, "bench.tar")
+        generate_archive(tar_path, entries)
+        config = {"hostname": "bench", "vfs_path": tar_path, "vfs_mode": mode, "index_cache": True}
+        cold = measure(config)
+        warm = measure(config)
+        emulator = ShellEmulator(config)
+        start = time.perf_counter()
+        emulator.session()
+        session = time.perf_counter() - start
+        print(f"startup {mode}, {entries} entries: cold {cold:.3f}s, warm {warm:.3f}s, new session {session:.6f}s")
+
+#команды в секунду для ls, cd, touch и uniq на архивах растущего размера
+def bench_commands(sizes, mode, repeat):
+    commands = {
+        "ls": lambda i: "ls",
+        "cd": lambda i: "cd /dir1" if i % 2 == 0 else "cd ..",
+        "touch": lambda i: f"touch new{i}.txt",
+        "uniq": lambda i: "uniq /dir0/file1.txt",
+    }
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for entries in sizes:
+            tar_path = os.path.join(temp_dir, f"bench{entries}.tar")
+            generate_archive(tar_path, entries)
+            config = {"hostname": "bench", "vfs_path": tar_path, "vfs_mode": mode}
+            for name, make_command in commands.items():
+                emulator = ShellEmulator(config)
+                start = time.perf_counter()
+                for i in range(repeat):
+                    emulator.execute_command(make_command(i))
+                elapsed = time.perf_counter() - start
+                print(f"{name} {mode}, {entries} entries: {repeat / elapsed:.0f} commands/s")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="ShellEmulator benchmarks")
+    arg_parser.add_argument("bench", nargs="?", default="startup", choices=["startup", "commands"])
+    arg_parser.add_argument("--entries", type=int, nargs="+", default=[100000])
+    arg_parser.add_argument("--mode", default="lazy", choices=["eager", "lazy", "mmap"])
+    arg_parser.add_argument("--repeat", type=int, default=1000, help="сколько раз выполнять каждую команду")
+    args = arg_parser.parse_args()
+    if args.bench == "startup":
+        for entries in args.entries:
+            bench_startup(entries, args.mode)
+    else:
+        bench_commands(args.entries, args.mode, args.repeat)
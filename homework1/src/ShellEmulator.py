@@ -1,40 +1,300 @@
 import os
+import sys
+import argparse
+import multiprocessing
+import mmap
 import tarfile
 import json
+import hashlib
+import shlex
 import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from collections import OrderedDict, ChainMap
 import tkinter as tk
 from tkinter import scrolledtext
 
+#потоковый uniq: выдает пары (строка, число повторов) в исходном порядке
+#adjacent - схлопываются только соседние повторы (как в настоящем uniq), память не зависит от файла
+#иначе повторы ищутся по всему файлу, в памяти только различные строки
+#число повторов считается только для count и repeated, в остальных случаях вместо него None
+#cancel - событие отмены: uniq может долго читать файл, ничего не выдавая, поэтому проверяем его сами
+def uniq_lines(lines, adjacent=False, count=False, repeated=False, cancel=None):
+    if cancel is not None:
+        lines = until_cancelled(lines, cancel)
+    if adjacent:
+        previous, n = None, 0
+        for line in lines:
+            if n and line == previous:
+                n += 1
+                continue
+            if n and (not repeated or n > 1):
+                yield previous, n
+            previous, n = line, 1
+        if n and (not repeated or n > 1):
+            yield previous, n
+    elif count or repeated: #количество известно только в конце файла
+        counts = {}
+        for line in lines:
+            counts[line] = counts.get(line, 0) + 1
+        for line, n in counts.items():
+            if not repeated or n > 1:
+                yield line, n
+    else:
+        seen = set()
+        for line in lines:
+            if line not in seen:
+                seen.add(line)
+                yield line, None
+
+#строки до отмены, событие проверяется раз в every строк, чтобы не замедлять чтение
+def until_cancelled(lines, cancel, every=1024):
+    for i, line in enumerate(lines):
+        if i % every == 0 and cancel.is_set():
+            return
+        yield line
+
+#строка из архива в режиме mmap хранится как memoryview, переводим в текст только при выводе
+def decode_line(line):
+    if isinstance(line, str):
+        return line
+    return bytes(line).decode("utf-8", errors="replace")
+
+#разбиение текста на строки без создания общего списка строк
+def split_text(text):
+    start = 0
+    while start < len(text):
+        pos = text.find("\n", start)
+        if pos == -1:
+            pos = len(text)
+        yield text[start:pos].rstrip("\r")
+        start = pos + 1
+
 class ShellEmulator:
-    def __init__(self, config):
+    def __init__(self, config, base=None):
+        self.config = config
         self.hostname = config["hostname"]
         self.vfs_path = config["vfs_path"]
         self.current_dir = "/"
-        self.vfs = {}
         self.start_time = time.time()
-        self.load_vfs(self.vfs_path)
+        #режим загрузки: eager - все содержимое сразу, lazy - только смещения файлов в архиве
+        self.vfs_mode = config.get("vfs_mode", "eager")
+        self.cache_size = config.get("cache_size", 64) #сколько файлов держим в кэше в режиме lazy
+        self.chunk_size = config.get("chunk_size", 65536) #размер блока при потоковом чтении файлов
+        self.index_cache = config.get("index_cache", False) #сохранять индекс архива в файл рядом с ним
+        self.cancel_event = None #событие отмены команды (ctrl+c в GUI), проверяется при долгом чтении файлов
+        if base is None:
+            #плоский словарь путь -> узел, у директорий в узле хранятся дочерние элементы
+            self.vfs = {"/": {"is_dir": True, "content": "", "children": {}}}
+            self.cache = OrderedDict()
+            self.mmap = None
+            self.load_vfs(self.vfs_path)
+            self.base = self.vfs #загруженная файловая система больше не меняется
+        else: #сеанс поверх уже загруженной файловой системы, архив не читается
+            self.base = base.base
+            self.cache = base.cache
+            self.mmap = base.mmap
+        #изменения сеанса пишутся в свой слой, чтение проходит насквозь до общей базы
+        self.vfs = ChainMap({}, self.base)
+        #таблица команд: имя -> обработчик, поиск команды за O(1)
+        self.commands = {
+            "ls": self.cmd_ls,
+            "cd": self.cmd_cd,
+            "exit": self.cmd_exit,
+            "uptime": self.cmd_uptime,
+            "touch": self.cmd_touch,
+            "uniq": self.cmd_uniq,
+            "cat": self.cmd_cat,
+            "head": self.cmd_head,
+        }
+
+    #новый сеанс над той же файловой системой за O(1): база и кэш общие, изменения у каждого свои
+    def session(self):
+        return ShellEmulator(self.config, base=self)
 
     #функция загрузки файловой системы
     def load_vfs(self, tar_path):
-        with tarfile.open(tar_path, "r") as tar:
-            for member in tar.getmembers():
-                self.vfs[f"/{member.name}"] = {
-                    "is_dir": member.isdir(),
-                    "content": "" if member.isdir() else tar.extractfile(member).read().decode("utf-8")
-                }
+        #индекс архива: путь, директория ли, смещение данных и размер каждого элемента
+        entries = self.load_index(tar_path) if self.index_cache else None
+        if entries is None:
+            entries = self.scan_archive(tar_path)
+            if self.index_cache:
+                self.save_index(tar_path, entries)
+
+        if self.vfs_mode == "eager": #читаем все содержимое сразу по смещениям из индекса
+            with tarfile.open(tar_path, "r") as tar:
+                for name, is_dir, offset, size in entries:
+                    if is_dir:
+                        self.add_node(f"/{name}", {"is_dir": True, "content": "", "children": {}})
+                    else:
+                        tar.fileobj.seek(offset)
+                        content = tar.fileobj.read(size).decode("utf-8", errors="replace")
+                        self.add_node(f"/{name}", {"is_dir": False, "content": content})
+        else: #запоминаем только где лежат данные файла
+            for name, is_dir, offset, size in entries:
+                if is_dir:
+                    self.add_node(f"/{name}", {"is_dir": True, "content": "", "children": {}})
+                else:
+                    self.add_node(f"/{name}", {"is_dir": False, "content": None, "offset": offset, "size": size})
+
+        if self.vfs_mode == "mmap": #отображаем архив в память, данные читаются прямо из него
+            #индекс мог быть построен в другом режиме по сжатому архиву, там смещения не совпадают с байтами файла;
+            #открытие в режиме "r:" читает только первый заголовок и не принимает сжатый архив
+            with tarfile.open(tar_path, "r:"):
+                pass
+            with open(tar_path, "rb") as f:
+                self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
         self.current_dir = "/"
 
+    #разбор заголовков архива
+    def scan_archive(self, tar_path):
+        entries = []
+        #для mmap архив должен быть несжатым, иначе данные файлов не лежат по смещениям
+        with tarfile.open(tar_path, "r:" if self.vfs_mode == "mmap" else "r") as tar:
+            for member in tar:
+                size = member.size if member.isfile() else 0
+                entries.append((member.name, member.isdir(), member.offset_data, size))
+        return entries
+
+    #ключ индекса: время изменения, размер и хэш начала и конца архива
+    def archive_key(self, tar_path):
+        stat = os.stat(tar_path)
+        digest = hashlib.sha256()
+        with open(tar_path, "rb") as f:
+            digest.update(f.read(65536))
+            if stat.st_size > 65536:
+                f.seek(max(65536, stat.st_size - 65536))
+                digest.update(f.read())
+        return {"mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": digest.hexdigest()}
+
+    #загрузка сохраненного индекса, None если его нет или архив изменился
+    def load_index(self, tar_path):
+        try:
+            with open(tar_path + ".idx", "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if index.get("version") != 1 or index.get("key") != self.archive_key(tar_path):
+            return None
+        return index["entries"]
+
+    #сохранение индекса рядом с архивом
+    #индекс только ускоряет запуск, поэтому если записать его нельзя (каталог только для чтения), работаем без него
+    def save_index(self, tar_path, entries):
+        index = {"version": 1, "key": self.archive_key(tar_path), "entries": entries}
+        temp_path = f"{tar_path}.idx.{os.getpid()}"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(index, f, separators=(",", ":"))
+            os.replace(temp_path, tar_path + ".idx") #атомарная замена, чтобы не оставить битый индекс
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    #содержимое файла в режиме mmap - срез архива без копирования
+    def file_view(self, node):
+        return memoryview(self.mmap)[node["offset"]:node["offset"] + node["size"]]
+
+    #строки файла в режиме mmap - срезы memoryview, байты не копируются и не декодируются
+    def iter_raw_lines(self, node):
+        start, end = node["offset"], node["offset"] + node["size"]
+        view = memoryview(self.mmap)
+        while start < end:
+            pos = self.mmap.find(b"\n", start, end)
+            if pos == -1:
+                pos = end
+            line_end = pos - 1 if pos > start and self.mmap[pos - 1] == 13 else pos #убираем \r
+            yield view[start:line_end]
+            start = pos + 1
+
+    #чтение содержимого файла, в режиме lazy - из архива по смещению через LRU-кэш
+    def read_file(self, node):
+        if node["content"] is not None:
+            return node["content"]
+        if self.vfs_mode == "mmap":
+            return bytes(self.file_view(node)).decode("utf-8", errors="replace")
+        key = node["offset"]
+        if key in self.cache:
+            self.cache.move_to_end(key) #недавно использованный файл
+            return self.cache[key]
+        with tarfile.open(self.vfs_path, "r") as tar:
+            tar.fileobj.seek(node["offset"])
+            content = tar.fileobj.read(node["size"]).decode("utf-8", errors="replace")
+        self.cache[key] = content
+        if len(self.cache) > self.cache_size: #выкидываем самый старый файл
+            self.cache.popitem(last=False)
+        return content
+
+    #построчное чтение файла, целиком файл в памяти не собирается
+    def iter_lines(self, node):
+        if node["content"] is not None or (self.vfs_mode == "lazy" and node["offset"] in self.cache):
+            yield from split_text(self.read_file(node))
+        elif self.vfs_mode == "mmap":
+            yield from self.iter_raw_lines(node)
+        elif node["size"] <= self.chunk_size: #маленький файл читаем целиком через кэш
+            yield from split_text(self.read_file(node))
+        else: #большой файл читаем блоками мимо кэша
+            with tarfile.open(self.vfs_path, "r") as tar:
+                tar.fileobj.seek(node["offset"])
+                left = node["size"]
+                tail = b""
+                while left > 0:
+                    if self.cancel_event is not None and self.cancel_event.is_set():
+                        return
+                    chunk = tar.fileobj.read(min(self.chunk_size, left))
+                    if not chunk:
+                        break
+                    left -= len(chunk)
+                    lines = (tail + chunk).split(b"\n")
+                    tail = lines.pop() #последняя строка может продолжиться в следующем блоке
+                    for line in lines:
+                        yield line.rstrip(b"\r").decode("utf-8", errors="replace")
+                if tail:
+                    yield tail.rstrip(b"\r").decode("utf-8", errors="replace")
+
+    #добавление узла в дерево, недостающие родительские директории создаются автоматически
+    def add_node(self, path, node):
+        existing = self.vfs.get(path)
+        if existing is not None and existing["is_dir"] and node["is_dir"]:
+            return existing #директория уже создана как родительская, сохраняем ее детей
+        parent_path, name = path.rsplit("/", 1)
+        parent_path = parent_path or "/"
+        parent = self.get_dir(parent_path)
+        if parent is None:
+            parent = self.add_node(parent_path, {"is_dir": True, "content": "", "children": {}})
+        elif isinstance(self.vfs, ChainMap) and parent_path not in self.vfs.maps[0]:
+            #директория из общей базы: копируем узел в слой сеанса, дети базы остаются общими
+            parent = dict(parent, children=ChainMap({}, parent["children"]))
+            self.vfs[parent_path] = parent
+        parent["children"][name] = node
+        self.vfs[path] = node
+        return node
+
+    #возвращает узел директории по пути или None
+    def get_dir(self, path):
+        node = self.vfs.get(path)
+        if node is not None and node["is_dir"]:
+            return node
+        return None
+
+    #полный путь к элементу текущей директории
+    def join_path(self, name):
+        return self.current_dir + "/"*(self.current_dir!="/") + name
+
     #выводит список файлов в текущей директории (команда ls)
     def ls(self):
-        files = []
-        #путь + / если не корень, current_dir если корень
-        prefix = self.current_dir if self.current_dir.endswith("/") else self.current_dir + "/"
-        for path in self.vfs:
-            if path.startswith(prefix): #проверяем путь
-                sub_path = path[len(prefix):].split("/", 1)[0]
-                if sub_path and sub_path not in files:
-                    files.append(sub_path)
-        return "\n".join(files)
+        return "\n".join(self.cmd_ls([], None))
+
+    #поиск файла по относительному или абсолютному пути, None если файла нет
+    def find_file(self, filename):
+        node = self.vfs.get(filename if filename.startswith("/") else self.join_path(filename))
+        if node is not None and not node["is_dir"]:
+            return node
+        return None
 
     #функция изменения директории (команда cd)
     def change_dir(self, path):
@@ -46,10 +306,12 @@ class ShellEmulator:
             else:
                 new_path = "/"
         else:  #относительный путь
-            new_path = self.current_dir + "/"*(self.current_dir!="/") + path
+            new_path = self.join_path(path)
+        if len(new_path) > 1:
+            new_path = new_path.rstrip("/")
 
         #проверка существует ли директория и директория ли она :0
-        if new_path in self.vfs and self.vfs[new_path]["is_dir"] or new_path=="/":
+        if self.get_dir(new_path) is not None:
             self.current_dir = new_path
         else:
             return f"cd: {path}: No such file or directory"
@@ -71,46 +333,144 @@ class ShellEmulator:
     #функция создания файла (команда touch)
     def touch(self, filename):
         #путь нового файла - текущая + / если не корень + имя
-        new_file_path = self.current_dir + "/"*(self.current_dir!="/") + filename
+        new_file_path = self.join_path(filename)
+        if self.get_dir(new_file_path.rsplit("/", 1)[0] or "/") is None: #родительской директории нет
+            return f"touch: cannot touch {filename}: No such file or directory"
         if new_file_path not in self.vfs:
-            self.vfs[new_file_path] = {"is_dir": False, "content": ""}
+            self.add_node(new_file_path, {"is_dir": False, "content": ""})
             return f"File {filename} created"
         return f"File {filename} already exists"
 
     #команда uniq - вывод уникальных строк
-    def uniq(self, filename):
-        file_path = self.current_dir + "/"*(self.current_dir!="/") + filename
+    #adjacent - только соседние повторы, count - с числом повторов (-c), repeated - только повторяющиеся (-d)
+    def uniq(self, filename, adjacent=False, count=False, repeated=False):
+        node = self.find_file(filename)
         #если есть файл такой и он не директория
-        if file_path in self.vfs and not self.vfs[file_path]["is_dir"]:
-            lines = self.vfs[file_path]["content"].splitlines()
-            uniq_lines = "\n".join(set(lines))
-            return uniq_lines
+        if node is not None:
+            return "\n".join(self.uniq_output(self.iter_lines(node), adjacent, count, repeated))
         return f"uniq: {filename}: No such file or directory"
 
+    #форматирование результата uniq построчно
+    def uniq_output(self, lines, adjacent, count, repeated):
+        for line, n in uniq_lines(lines, adjacent, count, repeated, self.cancel_event):
+            yield f"{n:>7} {decode_line(line)}" if count else decode_line(line)
+
+    #разбор строки на стадии конвейера: список (команда, аргументы)
+    def parse_command(self, command):
+        lexer = shlex.shlex(command, posix=True, punctuation_chars="|")
+        lexer.whitespace_split = True
+        stages = [[]]
+        for token in lexer:
+            if token == "|":
+                stages.append([])
+            else:
+                stages[-1].append(token)
+        if any(not stage for stage in stages):
+            raise ValueError("empty command in pipeline")
+        return [(stage[0], stage[1:]) for stage in stages]
+
+    #выполнение конвейера: стадии передают друг другу генераторы строк,
+    #поэтому данные читаются только по мере того, как их забирает последняя стадия
+    def run_pipeline(self, command):
+        if not command.strip():
+            return iter(())
+        try:
+            stages = self.parse_command(command)
+        except ValueError as e:
+            return iter([f"syntax error: {e}"])
+        lines = None
+        for name, args in stages:
+            handler = self.commands.get(name)
+            if handler is None:
+                return iter([f"{name}: command not found"])
+            lines = handler(args, lines)
+        return lines
+
     #функция выполнения команды, принимает команду, вызывает метод и возвращает значение
     def execute_command(self, command):
         #print(f"Executing command: {command}")
-        if command.startswith("ls"):
-            return self.ls()
-        elif command.startswith("cd "):
-            path = command.split(" ", 1)[1]
-            return self.change_dir(path)
-        elif command == "exit":
-            return self.exit_shell()
-        elif command == "uptime":
-            return self.uptime()
-        elif command.startswith("touch "):
-            filename = command.split(" ", 1)[1]
-            return self.touch(filename)
-        elif command.startswith("uniq "):
-            filename = command.split(" ", 1)[1]
-            return self.uniq(filename)
-        else:
-            return f"{command}: command not found"
+        return "\n".join(self.run_pipeline(command))
+
+    #обработчики команд: принимают аргументы и строки со входа конвейера (None, если входа нет),
+    #возвращают итератор строк вывода
+    def cmd_ls(self, args, stdin):
+        if args:
+            yield "usage: ls"
+            return
+        #берем детей текущей директории из дерева, без обхода всей файловой системы
+        node = self.get_dir(self.current_dir)
+        if node is not None:
+            yield from node["children"]
+
+    def cmd_cd(self, args, stdin):
+        if len(args) != 1:
+            yield "usage: cd dir"
+            return
+        result = self.change_dir(args[0])
+        if result:
+            yield result
+
+    def cmd_exit(self, args, stdin):
+        yield self.exit_shell()
+
+    def cmd_uptime(self, args, stdin):
+        yield self.uptime()
+
+    def cmd_touch(self, args, stdin):
+        if len(args) != 1:
+            yield "usage: touch file"
+            return
+        yield self.touch(args[0])
+
+    def cmd_uniq(self, args, stdin):
+        flags = [arg for arg in args if arg.startswith("-")]
+        files = [arg for arg in args if not arg.startswith("-")]
+        if len(files) > 1 or (not files and stdin is None) or any(flag not in ("-a", "-c", "-d") for flag in flags):
+            yield "usage: uniq [-a] [-c] [-d] file"
+            return
+        lines = stdin
+        if files:
+            node = self.find_file(files[0])
+            if node is None:
+                yield f"uniq: {files[0]}: No such file or directory"
+                return
+            lines = self.iter_lines(node)
+        yield from self.uniq_output(lines, "-a" in flags, "-c" in flags, "-d" in flags)
+
+    def cmd_cat(self, args, stdin):
+        if not args:
+            if stdin is not None:
+                yield from stdin
+            return
+        for filename in args:
+            node = self.find_file(filename)
+            if node is None:
+                yield f"cat: {filename}: No such file or directory"
+                continue
+            for line in self.iter_lines(node):
+                yield decode_line(line)
+
+    def cmd_head(self, args, stdin):
+        count = 10
+        if len(args) >= 2 and args[0] == "-n" and args[1].isdigit():
+            count = int(args[1])
+            args = args[2:]
+        if len(args) > 1 or (not args and stdin is None):
+            yield "usage: head [-n count] [file]"
+            return
+        lines = stdin
+        if args:
+            node = self.find_file(args[0])
+            if node is None:
+                yield f"head: {args[0]}: No such file or directory"
+                return
+            lines = (decode_line(line) for line in self.iter_lines(node))
+        #islice перестает забирать строки после count, предыдущие стадии дальше не читают
+        yield from islice(lines, count)
 
 
 class ShellGUI:
-    def __init__(self, root, emulator):
+    def __init__(self, root, emulator, max_lines=5000, page_size=1000):
         self.emulator = emulator #shellemulator object
         self.root = root #root window
         self.root.title(f"Shell Emulator - {emulator.hostname}") #title of the window
@@ -122,45 +482,220 @@ class ShellGUI:
         self.input_field = tk.Entry(root, width=100) #поле ввода
         self.input_field.grid(column=0, row=1) #размещение поля ввода
         self.input_field.bind("<Return>", self.process_input) #нажатие на enter вызывает rocess_input
+        self.root.bind("<Control-c>", self.cancel_command) #ctrl+c прерывает выполняемую команду
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
         #self.input_field.focus_set()
+
+        #команды выполняются в фоновом потоке, строки вывода передаются через очередь
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.output = queue.Queue(maxsize=10000) #ограничена, чтобы поток не опережал вывод
+        self.cancel_event = threading.Event()
+        self.emulator.cancel_event = self.cancel_event #команда, которая долго читает файл, тоже видит отмену
+        self.running = False
+        self.batch_size = 500 #сколько строк выводим за один проход
+        self.poll_interval = 30 #мс между проверками очереди
+
+        #вывод копится и записывается в поле одной вставкой, старые строки удаляются
+        self.max_lines = max_lines #сколько строк хранится в окне
+        self.page_size = page_size #после скольких строк вывода команды ждем Enter
+        self.pending = []
+        self.flush_scheduled = False
+        self.paused = False
         self.show_prompt() #выводим что готово к выполнению
         #print("constructor done")
 
     #функция вывода готовности к исполнению команд
     def show_prompt(self, message=""):
-        self.text_area.configure(state=tk.NORMAL)  #временно включаем запись в текстовое поле
         if (message==""): #по умолчанию - выводим юзернейм (готовность к выполнению команды)
-            self.text_area.insert(tk.END, f"{self.emulator.hostname}:~{self.emulator.current_dir}$ ")
+            self.write(f"{self.emulator.hostname}:~{self.emulator.current_dir}$ ")
         else: #иначе выводим сообщение
-            self.text_area.insert(tk.END, f"{message}")
+            self.write(f"{message}")
+
+    #добавление текста в очередь на вывод, запись в поле - когда Tk освободится
+    def write(self, text):
+        self.pending.append(text)
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.root.after_idle(self.flush)
+
+    #запись накопленного текста одной вставкой и обрезка старых строк
+    def flush(self):
+        self.flush_scheduled = False
+        text = "".join(self.pending)
+        self.pending = []
+        self.text_area.configure(state=tk.NORMAL)  #временно включаем запись в текстовое поле
+        self.text_area.insert(tk.END, text)
+        line_count = int(self.text_area.index("end-1c").split(".")[0])
+        if line_count > self.max_lines: #удаляем самые старые строки
+            self.text_area.delete("1.0", f"{line_count - self.max_lines + 1}.0")
         self.text_area.configure(state=tk.DISABLED)  #запрещаем ввод пользователем
         self.text_area.see(tk.END)
 
     #функция выполнения команды и вывода результата
     def process_input(self, event=None):
+        if self.paused: #enter на паузе выводит следующую страницу
+            self.input_field.delete(0, tk.END)
+            self.paused = False
+            self.page_lines = 0
+            self.root.after(self.poll_interval, self.poll_output)
+            return
+        if self.running: #пока команда выполняется, новые не принимаем
+            return
         user_input = self.input_field.get()
         self.input_field.delete(0, tk.END)
         #self.text_area.insert(tk.END, user_input + "\n")
         self.show_prompt(user_input + "\n")
-        result = self.emulator.execute_command(user_input)
-        if result:
-            #self.text_area.insert(tk.END, result + "\n")
-            self.show_prompt(result + "\n")
-        if result == "exit":
-            self.root.quit()
+        self.running = True
+        self.last_line = None
+        self.line_count = 0
+        self.page_lines = 0
+        self.cancel_event.clear()
+        self.executor.submit(self.run_command, user_input)
+        self.root.after(self.poll_interval, self.poll_output)
+
+    #выполнение команды в фоновом потоке
+    def run_command(self, command):
+        try:
+            for line in self.emulator.run_pipeline(command):
+                if self.cancel_event.is_set():
+                    break
+                self.output.put(line)
+        except Exception as e:
+            self.output.put(f"error: {e}")
+        finally:
+            self.output.put(None) #признак конца вывода
+
+    #перенос готовых строк из очереди в текстовое поле пачками
+    def poll_output(self):
+        batch = []
+        done = False
+        while not self.paused and len(batch) < self.batch_size:
+            try:
+                line = self.output.get_nowait()
+            except queue.Empty:
+                break
+            if line is None:
+                done = True
+                break
+            if self.cancel_event.is_set(): #вывод прерванной команды выбрасываем
+                continue
+            batch.append(line)
+            self.page_lines += 1
+            if self.page_lines >= self.page_size: #страница заполнена
+                self.paused = True
+        if batch:
+            self.show_prompt("\n".join(batch) + "\n")
+            self.last_line = batch[-1]
+            self.line_count += len(batch)
+        if self.paused and not done: #ждем enter, поток команды встанет на заполненной очереди
+            self.show_prompt("--More-- (Enter - next page, Ctrl+C - stop)\n")
+            return
+        self.paused = False
+        if not done:
+            self.root.after(self.poll_interval, self.poll_output)
+            return
+        self.running = False
+        if self.line_count == 1 and self.last_line == "exit":
+            self.close()
+            return
         self.show_prompt()
 
+    #прерывание команды по ctrl+c
+    def cancel_command(self, event=None):
+        if self.running and not self.cancel_event.is_set():
+            self.cancel_event.set()
+            self.show_prompt("^C\n")
+            if self.paused: #дочитываем и выбрасываем остаток вывода
+                self.paused = False
+                self.root.after(self.poll_interval, self.poll_output)
+
+    #завершение работы: прерываем команду и закрываем окно
+    def close(self):
+        self.cancel_event.set()
+        #очередь больше никто не читает: освобождаем ее, чтобы поток команды не остался ждать на put,
+        #после отмены он кладет не больше двух строк, место для них есть
+        while True:
+            try:
+                self.output.get_nowait()
+            except queue.Empty:
+                break
+        self.executor.shutdown(wait=False)
+        self.root.quit()
+
 def load_config(config_path):
     with open(config_path, 'r') as f:
         return json.load(f)
 
+#выполнение скрипта без GUI: команды построчно, вывод пишется в out по мере получения
+def run_script(emulator, lines, out):
+    count = 0
+    for command in lines:
+        command = command.strip()
+        if not command or command.startswith("#"): #пустые строки и комментарии пропускаем
+            continue
+        out.write(f"{emulator.hostname}:~{emulator.current_dir}$ {command}\n")
+        last_line, line_count = None, 0
+        for line in emulator.run_pipeline(command):
+            out.write(line + "\n")
+            last_line, line_count = line, line_count + 1
+        count += 1
+        if line_count == 1 and last_line == "exit":
+            break
+    return count
+
+#разобранная VFS, при fork дочерние процессы получают ее без повторной загрузки
+_base_emulator = None
+
+def _init_worker(config):
+    global _base_emulator
+    if _base_emulator is None: #без fork каждый процесс загружает VFS сам
+        _base_emulator = ShellEmulator(config)
+
+def _run_script_file(script_path):
+    start = time.perf_counter()
+    with open(script_path, "r") as script, open(script_path + ".out", "w") as out:
+        count = run_script(_base_emulator.session(), script, out)
+    return script_path, count, time.perf_counter() - start
+
+#параллельное выполнение скриптов, вывод каждого пишется в <скрипт>.out
+#каждый скрипт выполняется в своем сеансе, поэтому изменения VFS не переходят между скриптами
+def run_scripts(config, script_paths, workers=None):
+    global _base_emulator
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        _base_emulator = ShellEmulator(config)
+    else:
+        context = multiprocessing.get_context()
+    try:
+        with context.Pool(workers, initializer=_init_worker, initargs=(config,)) as pool:
+            yield from pool.imap_unordered(_run_script_file, script_paths)
+    finally:
+        _base_emulator = None
+
 def main():
-    config = load_config('config/config.json')
-    emulator = ShellEmulator(config)
+    arg_parser = argparse.ArgumentParser(description="Shell emulator")
+    arg_parser.add_argument("scripts", nargs="*", help="скрипты с командами для выполнения без GUI")
+    arg_parser.add_argument("--config", default="config/config.json")
+    arg_parser.add_argument("--headless", action="store_true", help="читать команды из stdin без GUI")
+    arg_parser.add_argument("--workers", type=int, default=None, help="число процессов для нескольких скриптов")
+    args = arg_parser.parse_args()
+
+    config = load_config(args.config)
+    if len(args.scripts) > 1: #несколько скриптов - параллельно
+        for script_path, count, elapsed in run_scripts(config, args.scripts, args.workers):
+            print(f"{script_path}: {count} commands in {elapsed:.3f}s")
+        return
 
-    root = tk.Tk()
-    gui = ShellGUI(root, emulator)
-    root.mainloop()
+    emulator = ShellEmulator(config)
+    if args.scripts:
+        with open(args.scripts[0], "r") as script:
+            run_script(emulator, script, sys.stdout)
+    elif args.headless:
+        run_script(emulator, sys.stdin, sys.stdout)
+    else:
+        root = tk.Tk()
+        gui = ShellGUI(root, emulator)
+        root.mainloop()
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,12 @@
+import io
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
 import tarfile
 import pytest
-from homework1.src.ShellEmulator import ShellEmulator
+from homework1.src.ShellEmulator import ShellEmulator, ShellGUI, run_script, run_scripts
 
 #создание тестовой виртуальной системы
 @pytest.fixture
@@ -125,3 +131,332 @@ def test_uniq(emulator):
     #отсутствующий файл
     result = emulator.uniq("nofile.txt")
     assert result == "uniq: nofile.txt: No such file or directory"
+
+
+def test_tree_index(emulator):
+    #дети директории хранятся в узле дерева
+    assert list(emulator.vfs["/dir2"]["children"]) == ["file2.txt"]
+
+    #созданный файл сразу виден в ls
+    emulator.change_dir("/dir1")
+    emulator.touch("new.txt")
+    assert emulator.ls() == "new.txt"
+
+    #файл нельзя создать в несуществующей директории
+    result = emulator.touch("nodir/new.txt")
+    assert result == "touch: cannot touch nodir/new.txt: No such file or directory"
+
+
+def test_implicit_dirs(tmp_path):
+    #архив без явных записей для директорий
+    tar_path = tmp_path / "implicit.tar"
+    file1 = tmp_path / "file.txt"
+    file1.write_text("data")
+    with tarfile.open(tar_path, "w") as tar:
+        tar.add(file1, arcname="a/b/file.txt")
+
+    emulator = ShellEmulator({"hostname": "test_host", "vfs_path": str(tar_path)})
+    assert emulator.ls() == "a"
+    assert emulator.change_dir("a/b") is None
+    assert emulator.ls() == "file.txt"
+
+
+def test_lazy_mode(virtual_fs):
+    config = {"hostname": "test_host", "vfs_path": virtual_fs, "vfs_mode": "lazy", "cache_size": 1}
+    emulator = ShellEmulator(config)
+
+    #при загрузке содержимое не читается
+    assert emulator.vfs["/file1.txt"]["content"] is None
+    assert emulator.ls() == "file1.txt\ndir1\ndir2"
+
+    #содержимое читается по требованию
+    result = emulator.uniq("file1.txt")
+    assert sorted(result.split("\n")) == ["line1", "line2"]
+
+    #кэш ограничен по размеру
+    emulator.change_dir("/dir2")
+    assert emulator.uniq("file2.txt") == "text in file2 WOW"
+    assert len(emulator.cache) == 1
+
+
+def test_binary_file(tmp_path):
+    #файл не в utf-8 не ломает загрузку
+    tar_path = tmp_path / "binary.tar"
+    binary = tmp_path / "binary.bin"
+    binary.write_bytes(b"\xff\xfe\x00text")
+    with tarfile.open(tar_path, "w") as tar:
+        tar.add(binary, arcname="binary.bin")
+
+    emulator = ShellEmulator({"hostname": "test_host", "vfs_path": str(tar_path)})
+    assert "text" in emulator.uniq("binary.bin")
+
+
+def test_mmap_mode(virtual_fs):
+    config = {"hostname": "test_host", "vfs_path": virtual_fs, "vfs_mode": "mmap"}
+    emulator = ShellEmulator(config)
+
+    #содержимое отдается срезом архива
+    view = emulator.file_view(emulator.vfs["/file1.txt"])
+    assert isinstance(view, memoryview)
+    assert view.tobytes() == b"line1\nline2\nline1\n"
+    view.release()
+
+    #uniq работает по байтам архива
+    assert emulator.uniq("file1.txt") == "line1\nline2"
+
+    #сжатый архив не поддерживается
+    compressed = virtual_fs + ".gz"
+    with tarfile.open(virtual_fs) as src, tarfile.open(compressed, "w:gz") as dst:
+        for member in src.getmembers():
+            dst.addfile(member, src.extractfile(member) if member.isfile() else None)
+    with pytest.raises(tarfile.ReadError):
+        ShellEmulator({"hostname": "test_host", "vfs_path": compressed, "vfs_mode": "mmap"})
+    #и тогда, когда индекс сжатого архива уже построен в другом режиме
+    ShellEmulator({"hostname": "test_host", "vfs_path": compressed, "vfs_mode": "lazy", "index_cache": True})
+    with pytest.raises(tarfile.ReadError):
+        ShellEmulator({"hostname": "test_host", "vfs_path": compressed, "vfs_mode": "mmap", "index_cache": True})
+
+
+def test_index_cache(virtual_fs):
+    config = {"hostname": "test_host", "vfs_path": virtual_fs, "vfs_mode": "lazy", "index_cache": True}
+    cold = ShellEmulator(config)
+    assert os.path.exists(virtual_fs + ".idx")
+
+    #повторный запуск берет индекс из файла, архив не разбирается
+    with patch.object(ShellEmulator, "scan_archive") as scan:
+        warm = ShellEmulator(config)
+        scan.assert_not_called()
+    assert warm.ls() == cold.ls()
+    assert warm.uniq("file1.txt") == "line1\nline2"
+
+    #после изменения архива индекс пересобирается
+    with tarfile.open(virtual_fs, "a") as tar:
+        tar.addfile(tarfile.TarInfo("empty.txt"))
+    changed = ShellEmulator(config)
+    assert "empty.txt" in changed.ls()
+
+    #индекс не записать (каталог только для чтения) - эмулятор запускается без него
+    os.remove(virtual_fs + ".idx")
+    with patch("homework1.src.ShellEmulator.os.replace", side_effect=PermissionError):
+        emulator = ShellEmulator(config)
+    assert "empty.txt" in emulator.ls()
+    assert not [name for name in os.listdir(os.path.dirname(virtual_fs)) if ".idx" in name] #временный файл удален
+
+
+def test_uniq_modes(emulator):
+    emulator.vfs["/log.txt"] = {"is_dir": False, "content": "b\na\na\nb\nc\nc\nc"}
+
+    #порядок строк сохраняется
+    assert emulator.uniq("log.txt") == "b\na\nc"
+
+    #только соседние повторы
+    assert emulator.uniq("log.txt", adjacent=True) == "b\na\nb\nc"
+
+    #количество повторов и только повторяющиеся строки
+    assert emulator.execute_command("uniq -c log.txt") == "      2 b\n      2 a\n      3 c"
+    assert emulator.execute_command("uniq -a -d log.txt") == "a\nc"
+    assert emulator.execute_command("uniq -x log.txt") == "usage: uniq [-a] [-c] [-d] file"
+
+
+def test_uniq_streaming(tmp_path):
+    #файл больше блока читается по частям, строки на границе блоков не теряются
+    tar_path = tmp_path / "big.tar"
+    big = tmp_path / "big.txt"
+    big.write_text("".join(f"line{i % 5}\n" for i in range(1000)))
+    with tarfile.open(tar_path, "w") as tar:
+        tar.add(big, arcname="big.txt")
+
+    for mode in ("lazy", "mmap"):
+        config = {"hostname": "test_host", "vfs_path": str(tar_path), "vfs_mode": mode, "chunk_size": 7}
+        emulator = ShellEmulator(config)
+        assert emulator.uniq("big.txt") == "line0\nline1\nline2\nline3\nline4"
+        assert emulator.uniq("big.txt", count=True).split("\n")[0] == "    200 line0"
+        assert len(emulator.cache) == 0
+
+    #после отмены большой файл дальше не читается
+    emulator = ShellEmulator({"hostname": "test_host", "vfs_path": str(tar_path), "vfs_mode": "lazy", "chunk_size": 7})
+    emulator.cancel_event = threading.Event()
+    emulator.cancel_event.set()
+    assert list(emulator.iter_lines(emulator.find_file("big.txt"))) == []
+
+
+def test_dispatcher(emulator):
+    #команда определяется по имени целиком, а не по префиксу
+    assert emulator.execute_command("lsblah") == "lsblah: command not found"
+    assert emulator.execute_command("ls") == "file1.txt\ndir1\ndir2"
+
+    #аргументы в кавычках
+    assert emulator.execute_command('touch "my file.txt"') == "File my file.txt created"
+
+    #ошибки разбора
+    assert emulator.execute_command("ls |") == "syntax error: empty command in pipeline"
+    assert emulator.execute_command("") == ""
+
+
+def test_pipeline(emulator):
+    emulator.vfs["/big.log"] = {"is_dir": False, "content": "a\nb\na\nc\nd\nb"}
+    assert emulator.execute_command("cat big.log | uniq | head -n 2") == "a\nb"
+    assert emulator.execute_command("cat /dir2/file2.txt|uniq -c") == "      1 text in file2 WOW"
+
+    #последняя стадия забирает только нужное количество строк
+    consumed = []
+    def source(args, stdin):
+        for i in range(1000):
+            consumed.append(i)
+            yield f"line{i}"
+    emulator.commands["gen"] = source
+    assert emulator.execute_command("gen | head -n 3") == "line0\nline1\nline2"
+    assert len(consumed) == 3
+
+
+def test_run_script(emulator):
+    script = ["# comment", "cd dir2", "", "ls", "exit", "ls"]
+    out = io.StringIO()
+    count = run_script(emulator, script, out)
+
+    #выполнение останавливается на exit
+    assert count == 3
+    assert out.getvalue() == "test_host:~/$ cd dir2\ntest_host:~/dir2$ ls\nfile2.txt\ntest_host:~/dir2$ exit\nexit\n"
+
+
+def test_run_scripts_parallel(virtual_fs, tmp_path):
+    config = {"hostname": "test_host", "vfs_path": virtual_fs}
+    scripts = []
+    for i in range(3):
+        script = tmp_path / f"script{i}.txt"
+        script.write_text(f"touch new{i}.txt\nls\n")
+        scripts.append(str(script))
+
+    results = sorted(run_scripts(config, scripts, workers=2))
+    assert [count for _, count, _ in results] == [2, 2, 2]
+
+    #каждый скрипт работает со своей копией файловой системы
+    for i, script in enumerate(scripts):
+        with open(script + ".out") as f:
+            output = f.read()
+        assert f"new{i}.txt" in output
+        assert all(f"new{j}.txt" not in output for j in range(3) if j != i)
+
+
+def test_sessions(emulator):
+    first = emulator.session()
+    second = emulator.session()
+
+    #база общая, архив повторно не читается
+    assert first.base is emulator.base and second.base is emulator.base
+
+    #изменения одного сеанса не видны другим
+    first.change_dir("/dir2")
+    assert first.touch("only_first.txt") == "File only_first.txt created"
+    assert first.ls() == "file2.txt\nonly_first.txt"
+    second.change_dir("/dir2")
+    assert second.ls() == "file2.txt"
+    assert "/dir2/only_first.txt" not in emulator.base
+
+    #создание файла в корне не меняет общий узел директории
+    second.change_dir("/")
+    second.touch("root.txt")
+    assert list(emulator.base["/"]["children"]) == ["file1.txt", "dir1", "dir2"]
+    assert emulator.ls() == "file1.txt\ndir1\ndir2"
+
+
+def test_gui_close_unblocks_worker(emulator):
+    #окно закрыто, пока поток команды ждет на заполненной очереди: поток должен завершиться
+    gui = ShellGUI.__new__(ShellGUI)
+    gui.root = MagicMock()
+    gui.executor = ThreadPoolExecutor(max_workers=1)
+    gui.output = queue.Queue(maxsize=10)
+    gui.cancel_event = threading.Event()
+    gui.emulator = MagicMock()
+    gui.emulator.run_pipeline.return_value = (f"line{i}" for i in range(1000))
+    future = gui.executor.submit(gui.run_command, "cat")
+    while not gui.output.full():
+        pass
+    gui.close()
+    future.result(timeout=5)
+
+
+def test_gui_cancel_long_command(emulator):
+    #uniq -c ничего не выводит до конца файла, отмена должна остановить чтение очень длинного файла
+    gui = ShellGUI.__new__(ShellGUI)
+    gui.executor = ThreadPoolExecutor(max_workers=1)
+    gui.output = queue.Queue()
+    gui.cancel_event = threading.Event()
+    gui.emulator = emulator
+    emulator.cancel_event = gui.cancel_event
+
+    def endless(node):
+        for i in range(10 ** 8):
+            if i == 10000: #ctrl+c во время чтения
+                gui.cancel_event.set()
+            yield "line"
+
+    with patch.object(emulator, "iter_lines", side_effect=endless):
+        gui.executor.submit(gui.run_command, "uniq -c file1.txt").result(timeout=5)
+    assert gui.output.get_nowait() is None #вывод прерванной команды не попал в очередь
+    gui.executor.shutdown()
+
+
+#окно без Tk: root и поля - заглушки, вставки в поле проверяются по вызовам
+def make_gui(emulator, max_lines=5000, page_size=1000):
+    gui = ShellGUI.__new__(ShellGUI)
+    gui.root = MagicMock()
+    gui.text_area = MagicMock()
+    gui.input_field = MagicMock()
+    gui.emulator = emulator
+    gui.output = queue.Queue()
+    gui.cancel_event = threading.Event()
+    gui.batch_size = 500
+    gui.poll_interval = 30
+    gui.max_lines = max_lines
+    gui.page_size = page_size
+    gui.pending = []
+    gui.flush_scheduled = False
+    gui.paused = False
+    return gui
+
+
+def test_gui_flush(emulator):
+    gui = make_gui(emulator, max_lines=5)
+    #несколько записей до отрисовки - одна отложенная вставка
+    gui.write("a\n")
+    gui.write("b\n")
+    gui.write("c\n")
+    gui.root.after_idle.assert_called_once_with(gui.flush)
+    gui.text_area.index.return_value = "12.0" #после вставки в поле 12 строк
+    gui.flush()
+    gui.text_area.insert.assert_called_once_with("end", "a\nb\nc\n")
+    #остаются последние max_lines строк
+    gui.text_area.delete.assert_called_once_with("1.0", "8.0")
+    assert gui.pending == [] and not gui.flush_scheduled
+
+    #строк не больше предела - ничего не удаляется
+    gui.text_area.reset_mock()
+    gui.write("d\n")
+    gui.text_area.index.return_value = "4.0"
+    gui.flush()
+    gui.text_area.delete.assert_not_called()
+
+
+def test_gui_paging(emulator):
+    gui = make_gui(emulator, page_size=3)
+    gui.running, gui.line_count, gui.page_lines, gui.last_line = True, 0, 0, None
+    for i in range(5):
+        gui.output.put(f"line{i}")
+    gui.output.put(None)
+
+    #после page_size строк вывод встает на паузу и ждет Enter
+    gui.poll_output()
+    assert gui.paused and gui.running
+    assert gui.pending == ["line0\nline1\nline2\n", "--More-- (Enter - next page, Ctrl+C - stop)\n"]
+    gui.root.after.assert_not_called()
+
+    #Enter продолжает вывод со следующей страницы
+    gui.process_input()
+    assert not gui.paused
+    gui.root.after.assert_called_once_with(gui.poll_interval, gui.poll_output)
+    gui.poll_output()
+    assert not gui.running
+    assert gui.pending[2:] == ["line3\nline4\n", "test_host:~/$ "]
+    assert gui.line_count == 5
+
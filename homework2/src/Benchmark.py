@@ -0,0 +1,262 @@
+import argparse
+import functools
+import gzip
+import hashlib
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+import yaml
+from collections import deque
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from Visualizer import DependencyVisualizer, DependencyGraph
+
+#генерация файла Packages, похожего на настоящий: зависимости с версиями и альтернативами,
+#виртуальные пакеты и многострочные описания
+def generate_packages(path, stanzas, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(stanzas):
+            f.write(f"Package: pkg{i}\n")
+            f.write(f"Version: 1.{i % 10}-{i % 7}ubuntu1\n")
+            f.write(f"Architecture: amd64\nMaintainer: Bench <bench@example.com>\nInstalled-Size: {i % 5000}\n")
+            if i > 0:
+                deps = []
+                for _ in range(rng.randint(0, 6)):
+                    dep = rng.randrange(i)
+                    if rng.random() < 0.2:
+                        deps.append(f"pkg{dep} (>= 1.0) | virtual{dep % 100}")
+                    else:
+                        deps.append(f"pkg{dep} (>= 1.{dep % 10})")
+                if deps:
+                    f.write("Depends: " + ", ".join(deps) + "\n")
+                if rng.random() < 0.05:
+                    f.write(f"Pre-Depends: pkg{rng.randrange(i)}\n")
+            if i % 50 == 0:
+                f.write(f"Provides: virtual{i % 100}\n")
+            f.write(f"Description: package number {i}\n This is a long description\n spanning several lines.\n .\n")
+            f.write(f"SHA256: {i:064x}\n\n")
+
+#визуализатор с конфигурацией во временном каталоге
+def make_visualizer(temp_dir, repo_url, **options):
+    config = {"package": "pkg0", "repo_url": repo_url, "visualizer_path": "mmdc"}
+    config.update(options)
+    config_path = os.path.join(temp_dir, "config.yaml")
+    with open(config_path, "w") as f:
+        yaml.safe_dump(config, f)
+    return DependencyVisualizer(config_path)
+
+#время и пиковая память разбора индекса
+def bench_parse(stanzas):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        packages_path = os.path.join(temp_dir, "Packages")
+        generate_packages(packages_path, stanzas)
+        size = os.path.getsize(packages_path) / 2**20
+        visualizer = make_visualizer(temp_dir, packages_path, dependency_fields=["Pre-Depends", "Depends"])
+
+        start = time.perf_counter()
+        package_data = visualizer.load_data()
+        elapsed = time.perf_counter() - start
+        #память меряем отдельным проходом, tracemalloc сильно замедляет разбор
+        tracemalloc.start()
+        visualizer.load_data()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"parse {stanzas} stanzas ({size:.1f} MiB): {elapsed:.3f}s, "
+              f"peak memory {peak / 2**20:.1f} MiB, {len(package_data)} packages")
+
+#случайный граф зависимостей: пакет зависит от пакетов с меньшими номерами, плюс один цикл
+def generate_graph(packages, seed=0):
+    rng = random.Random(seed)
+    package_data = {}
+    for i in range(1, packages):
+        deps = {f"pkg{rng.randrange(i)}" for _ in range(rng.randint(1, 4))}
+        deps.add(f"pkg{i - 1}") #цепочка, чтобы замыкания были большими
+        package_data[f"pkg{i}"] = sorted(deps)
+    package_data["pkg0"] = [f"pkg{packages - 1}"] #цикл через весь граф
+    return package_data
+
+#прежняя реализация: очередь в списке, pop(0) за O(n)
+def legacy_closure(package_data, root):
+    visited = set()
+    queue = [root]
+    while queue:
+        current = queue.pop(0)
+        if current in visited:
+            continue
+        visited.add(current)
+        for dep in package_data.get(current, ()):
+            if dep not in visited:
+                queue.append(dep)
+    return visited
+
+#обход по словарю строк с deque
+def deque_closure(package_data, root):
+    visited = {root}
+    queue = deque([root])
+    while queue:
+        for dep in package_data.get(queue.popleft(), ()):
+            if dep not in visited:
+                visited.add(dep)
+                queue.append(dep)
+    return visited
+
+#транзитивное замыкание от нескольких корней тремя способами
+def bench_closure(packages, roots):
+    package_data = generate_graph(packages)
+    root_names = [f"pkg{i}" for i in range(roots)] #все они через цикл достают большую часть графа
+
+    start = time.perf_counter()
+    graph = DependencyGraph(package_data)
+    build = time.perf_counter() - start
+
+    for name, closure in (("legacy list.pop(0)", lambda root: legacy_closure(package_data, root)),
+                          ("dict + deque", lambda root: deque_closure(package_data, root)),
+                          ("CSR engine", graph.closure)):
+        start = time.perf_counter()
+        sizes = [len(closure(root)) for root in root_names]
+        elapsed = time.perf_counter() - start
+        print(f"closure {name}, {packages} packages, {roots} roots: {elapsed:.3f}s (closure size {sizes[0]})")
+    print(f"CSR engine build: {build:.3f}s, {graph.edge_count()} edges")
+
+#замыкания для многих корней: обход от каждого корня заново и через общие замыкания компонент
+def bench_batch(packages, roots):
+    graph = DependencyGraph(generate_graph(packages))
+    rng = random.Random(1)
+    root_names = [f"pkg{rng.randrange(packages)}" for _ in range(roots)]
+
+    start = time.perf_counter()
+    for root in root_names:
+        graph.closure(root)
+    separate = time.perf_counter() - start
+
+    start = time.perf_counter()
+    graph.strongly_connected_components()
+    components = time.perf_counter() - start
+    start = time.perf_counter()
+    graph.closures(root_names)
+    shared = time.perf_counter() - start
+    print(f"batch {roots} roots, {packages} packages: separate {separate:.3f}s, "
+          f"shared {shared:.3f}s (+{components:.3f}s for components)")
+
+#локальный http-сервер, каждый ответ задерживается на latency секунд, как у удаленного зеркала
+class SlowHandler(SimpleHTTPRequestHandler):
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+#загрузка нескольких сжатых индексов по http: по очереди и параллельно
+def bench_sources(stanzas, sources, latency):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        urls = []
+        SlowHandler.latency = latency
+        server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(SlowHandler, directory=temp_dir))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        for i in range(sources):
+            packages_path = os.path.join(temp_dir, f"Packages{i}")
+            generate_packages(packages_path, stanzas, seed=i)
+            with open(packages_path, "rb") as src, gzip.open(packages_path + ".gz", "wb") as dst:
+                dst.write(src.read())
+            urls.append(f"http://127.0.0.1:{server.server_address[1]}/Packages{i}.gz")
+        try:
+            visualizer = make_visualizer(temp_dir, urls)
+            start = time.perf_counter()
+            for url in urls:
+                visualizer.read_source(url)
+            sequential = time.perf_counter() - start
+            start = time.perf_counter()
+            visualizer.load_sources()
+            concurrent = time.perf_counter() - start
+        finally:
+            server.shutdown()
+        print(f"sources {sources} x {stanzas} stanzas, latency {latency}s: "
+              f"sequential {sequential:.3f}s, concurrent {concurrent:.3f}s")
+
+#обновление кэша по pdiff против полной перезагрузки, меняются зависимости changes пакетов
+def bench_incremental(stanzas, changes):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        packages_path = os.path.join(temp_dir, "Packages")
+        generate_packages(packages_path, stanzas)
+        visualizer = make_visualizer(temp_dir, packages_path, cache_dir=os.path.join(temp_dir, "cache"), incremental=True)
+        visualizer.load_data()
+
+        with open(packages_path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        rng = random.Random(2)
+        depends = [i for i, line in enumerate(lines) if line.startswith("Depends:")]
+        script = []
+        for i in sorted(rng.sample(depends, changes), reverse=True): #ed-скрипт идет снизу вверх
+            lines[i] = lines[i].rstrip("\n") + f", pkg{rng.randrange(stanzas)}\n"
+            script.append(f"{i + 1}c\n{lines[i]}.\n")
+        with open(packages_path, "rb") as f:
+            old_hash = hashlib.sha256(f.read()).hexdigest()
+        new_text = "".join(lines)
+        patch = "".join(script).encode("utf-8")
+        diff_dir = os.path.join(temp_dir, "Packages.diff")
+        os.makedirs(diff_dir)
+        with gzip.open(os.path.join(diff_dir, "T-1.gz"), "wb") as f:
+            f.write(patch)
+        with open(os.path.join(diff_dir, "Index"), "w") as f:
+            f.write(f"SHA256-Current: {hashlib.sha256(new_text.encode('utf-8')).hexdigest()} {len(new_text)}\n"
+                    f"SHA256-History:\n {old_hash} 0 T-1\n")
+        with open(packages_path, "w", encoding="utf-8") as f:
+            f.write(new_text)
+
+        start = time.perf_counter()
+        visualizer.load_data()
+        incremental = time.perf_counter() - start
+        start = time.perf_counter()
+        make_visualizer(temp_dir, packages_path).load_data()
+        full = time.perf_counter() - start
+        print(f"update {changes} of {stanzas} stanzas: pdiff {incremental:.3f}s, full reparse {full:.3f}s")
+
+#метрики всего индекса: число зависящих через битовые множества против обратного обхода от каждого пакета
+def bench_analytics(packages, roots):
+    package_data = generate_graph(packages)
+    del package_data["pkg0"] #без цикла через весь граф, иначе все пакеты в одной компоненте
+    graph = DependencyGraph(package_data)
+    start = time.perf_counter()
+    counts = graph.reverse_dependency_counts()
+    whole = time.perf_counter() - start
+    start = time.perf_counter()
+    for name in graph.names[:roots]:
+        graph.reverse_dependencies(name)
+    separate = time.perf_counter() - start
+    start = time.perf_counter()
+    graph.fan_in()
+    graph.longest_chain()
+    other = time.perf_counter() - start
+    print(f"reverse counts, {packages} packages: all packages {whole:.3f}s, "
+          f"reverse traversal {separate / roots * packages:.1f}s (estimated from {roots} roots); "
+          f"fan-in + longest chain {other:.3f}s, top {graph.ranking(counts, 1)}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="DependencyVisualizer benchmarks")
+    arg_parser.add_argument("bench", nargs="?", default="parse", choices=["parse", "closure", "batch", "sources", "incremental", "analytics"])
+    arg_parser.add_argument("--stanzas", type=int, default=60000)
+    arg_parser.add_argument("--packages", type=int, default=50000)
+    arg_parser.add_argument("--roots", type=int, default=5)
+    arg_parser.add_argument("--sources", type=int, default=4)
+    arg_parser.add_argument("--changes", type=int, default=100, help="сколько пакетов меняет дифф")
+    arg_parser.add_argument("--latency", type=float, default=0.5, help="задержка ответа сервера в секундах")
+    args = arg_parser.parse_args()
+    if args.bench == "parse":
+        bench_parse(args.stanzas)
+    elif args.bench == "closure":
+        bench_closure(args.packages, args.roots)
+    elif args.bench == "batch":
+        bench_batch(args.packages, args.roots)
+    elif args.bench == "sources":
+        bench_sources(args.stanzas, args.sources, args.latency)
+    elif args.bench == "incremental":
+        bench_incremental(args.stanzas, args.changes)
+    elif args.bench == "analytics":
+        bench_analytics(args.packages, args.roots)
@@ -1,18 +1,725 @@
 import yaml
 import subprocess
+import shutil
+import html
 import sys
-from collections import defaultdict
+from collections import Counter, OrderedDict, defaultdict, deque
+from collections.abc import Mapping
+from abc import ABC, abstractmethod
+from array import array
+from itertools import repeat
 import os
+import io
+import json
+import hashlib
+import heapq
+import operator
+import mmap
+import struct
+import lzma
+import re
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+from urllib.request import url2pathname
 import requests
+from requests.adapters import HTTPAdapter
 import gzip
 
+#скомпилированный индекс пакетов: имя -> зависимости, читается из файла через mmap
+#формат: заголовок, таблица записей (смещение и длина имени, смещение и длина зависимостей),
+#отсортированная по имени, затем блок строк в utf-8
+class PackageIndex(Mapping):
+    MAGIC = b"PKGC"
+    VERSION = 2 #с версии 2 в индексе есть и пакеты без зависимостей
+    HEADER = struct.Struct("<4sHI")
+    ENTRY = struct.Struct("<IIII")
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = self.HEADER.unpack_from(self.mmap, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            self.mmap.close()
+            raise ValueError(f"unsupported package index: {path}")
+        self.blob_start = self.HEADER.size + self.count * self.ENTRY.size
+
+    #запись словаря имя -> зависимости в файл индекса
+    @classmethod
+    def write(cls, path, package_data):
+        names = sorted(package_data, key=lambda name: name.encode("utf-8"))
+        entries = []
+        blob = io.BytesIO()
+        for name in names:
+            name_bytes = name.encode("utf-8")
+            deps_bytes = ",".join(package_data[name]).encode("utf-8")
+            name_off = blob.tell()
+            blob.write(name_bytes)
+            deps_off = blob.tell()
+            blob.write(deps_bytes)
+            entries.append(cls.ENTRY.pack(name_off, len(name_bytes), deps_off, len(deps_bytes)))
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(names)))
+            f.writelines(entries)
+            f.write(blob.getvalue())
+        os.replace(temp_path, path) #атомарная замена, чтобы не оставить битый индекс
+
+    #имя записи с номером i (байты из mmap)
+    def name_at(self, i):
+        name_off, name_len, _, _ = self.ENTRY.unpack_from(self.mmap, self.HEADER.size + i * self.ENTRY.size)
+        start = self.blob_start + name_off
+        return self.mmap[start:start + name_len]
+
+    #двоичный поиск записи по имени, -1 если пакета нет
+    def find(self, name):
+        key = name.encode("utf-8")
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.name_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self.name_at(low) == key:
+            return low
+        return -1
+
+    def __getitem__(self, name):
+        i = self.find(name)
+        if i < 0:
+            raise KeyError(name)
+        _, _, deps_off, deps_len = self.ENTRY.unpack_from(self.mmap, self.HEADER.size + i * self.ENTRY.size)
+        start = self.blob_start + deps_off
+        deps = self.mmap[start:start + deps_len].decode("utf-8")
+        return deps.split(",") if deps else []
+
+    def __contains__(self, name):
+        return self.find(name) >= 0
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.name_at(i).decode("utf-8")
+
+    def __len__(self):
+        return self.count
+
+    #последовательный обход всех записей таблицы, без двоичного поиска для каждого имени
+    def items(self):
+        table = self.mmap[self.HEADER.size:self.blob_start]
+        blob = self.mmap[self.blob_start:]
+        for name_off, name_len, deps_off, deps_len in self.ENTRY.iter_unpack(table):
+            deps = blob[deps_off:deps_off + deps_len].decode("utf-8")
+            yield blob[name_off:name_off + name_len].decode("utf-8"), deps.split(",") if deps else []
+
+    def close(self):
+        self.mmap.close()
+
+
+#запись о пакете из файла Packages
+#поля зависимостей: имя поля -> кортеж групп альтернатив, альтернатива - (имя, отношение, версия)
+class PackageRecord:
+    __slots__ = ("name", "version", "relations", "provides")
+
+    def __init__(self, name, version, relations, provides):
+        self.name = name
+        self.version = version
+        self.relations = relations
+        self.provides = provides
+
+    def __repr__(self):
+        return f"PackageRecord({self.name!r}, {self.version!r})"
+
+
+#команда ed-скрипта из pdiff: строка или диапазон строк и действие
+PATTERN_ED = re.compile(r"(\d+)(?:,(\d+))?([acd])$")
+
+#применение ed-скрипта (diff --ed) к списку строк
+#команды в скрипте идут снизу вверх, поэтому результат собирается за один проход сверху вниз
+def apply_ed_diff(lines, patch):
+    commands = []
+    patch = iter(patch)
+    for command in patch:
+        match = PATTERN_ED.match(command.rstrip("\n"))
+        if not match:
+            raise ValueError(f"unsupported ed command: {command.strip()}")
+        start, end, action = int(match.group(1)), int(match.group(2) or match.group(1)), match.group(3)
+        text = []
+        if action != "d":
+            for line in patch:
+                if line.rstrip("\n") == ".":
+                    break
+                text.append(line)
+            else:
+                raise ValueError("unterminated text in ed script")
+        #a - вставка после строки start, c и d - замена и удаление строк start..end
+        commands.append((start if action == "a" else start - 1, start if action == "a" else end, text))
+
+    result = []
+    position = 0 #сколько строк исходного списка уже перенесено
+    for keep, skip, text in reversed(commands):
+        if keep < position or skip > len(lines):
+            raise ValueError("ed commands are out of order or out of range")
+        result.extend(lines[position:keep])
+        result.extend(text)
+        position = skip
+    result.extend(lines[position:])
+    return result
+
+
+#граф зависимостей всего индекса: имена пакетов заменены целыми номерами,
+#списки смежности хранятся в сжатом виде (CSR): зависимости пакета i - targets[offsets[i]:offsets[i + 1]]
+class DependencyGraph:
+    def __init__(self, package_data):
+        self.names = [] #номер -> имя
+        self.ids = {} #имя -> номер
+        rows = []
+        for name, deps in package_data.items():
+            rows.append((self.intern(name), [self.intern(dep) for dep in deps]))
+
+        count = len(self.names)
+        self.offsets = array("I", bytes(4 * (count + 1)))
+        for source, targets in rows:
+            self.offsets[source + 1] = len(targets)
+        for i in range(count): #префиксные суммы - начало списка каждого пакета
+            self.offsets[i + 1] += self.offsets[i]
+        self.targets = array("I", bytes(4 * self.offsets[count]))
+        for source, targets in rows:
+            start = self.offsets[source]
+            self.targets[start:start + len(targets)] = array("I", targets)
+        self.reverse_graph = None
+        self.components = None
+        self.analytics = {} #посчитанные по всему индексу результаты запросов
+        self.bfs_cache = OrderedDict() #обходы от недавних корней, у каждого массив на весь граф
+        self.bfs_cache_size = 8
+
+    #номер пакета, новый номер для неизвестного имени
+    def intern(self, name):
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def __len__(self):
+        return len(self.names)
+
+    def edge_count(self):
+        return len(self.targets)
+
+    def successors(self, i):
+        return self.targets[self.offsets[i]:self.offsets[i + 1]]
+
+    #обход от пакета root в ширину (bfs) или в глубину (dfs), max_depth ограничивает глубину
+    #возвращает номера пакетов в порядке обхода, первым идет сам root
+    def closure(self, root, max_depth=None, order="bfs"):
+        start = self.ids[root]
+        visited = bytearray(len(self.names))
+        visited[start] = 1
+        offsets, targets = self.offsets, self.targets
+        if order == "bfs": #обход по уровням, глубина - номер уровня
+            result = []
+            frontier = [start]
+            depth = 0
+            while frontier:
+                result.extend(frontier)
+                if max_depth is not None and depth >= max_depth:
+                    break
+                next_frontier = []
+                for current in frontier:
+                    for target in targets[offsets[current]:offsets[current + 1]]:
+                        if not visited[target]:
+                            visited[target] = 1
+                            next_frontier.append(target)
+                frontier = next_frontier
+                depth += 1
+            return result
+        result = []
+        stack = deque([(start, 0)])
+        while stack:
+            current, depth = stack.pop()
+            result.append(current)
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for target in targets[offsets[current]:offsets[current + 1]]:
+                if not visited[target]:
+                    visited[target] = 1
+                    stack.append((target, depth + 1))
+        return result
+
+    #имена пакетов из обхода
+    def closure_names(self, root, max_depth=None, order="bfs"):
+        return [self.names[i] for i in self.closure(root, max_depth, order)]
+
+    #обратный граф: кто зависит от пакета, строится один раз
+    def reverse(self):
+        if self.reverse_graph is None:
+            reverse_graph = DependencyGraph.__new__(DependencyGraph)
+            reverse_graph.names = self.names
+            reverse_graph.ids = self.ids
+            count = len(self.names)
+            reverse_graph.offsets = array("I", bytes(4 * (count + 1)))
+            for target in self.targets: #число входящих ребер
+                reverse_graph.offsets[target + 1] += 1
+            for i in range(count):
+                reverse_graph.offsets[i + 1] += reverse_graph.offsets[i]
+            reverse_graph.targets = array("I", bytes(4 * len(self.targets)))
+            position = array("I", reverse_graph.offsets[:count])
+            for source in range(count):
+                for i in range(self.offsets[source], self.offsets[source + 1]):
+                    target = self.targets[i]
+                    reverse_graph.targets[position[target]] = source
+                    position[target] += 1
+            reverse_graph.reverse_graph = self
+            reverse_graph.components = None
+            reverse_graph.analytics = {}
+            self.reverse_graph = reverse_graph
+        return self.reverse_graph
+
+    #пакеты, которые зависят от root напрямую или транзитивно
+    def reverse_dependencies(self, root, max_depth=None):
+        return self.reverse().closure_names(root, max_depth)[1:]
+
+    #компоненты сильной связности (алгоритм Тарьяна без рекурсии)
+    #возвращает массив пакет -> номер компоненты; компоненты пронумерованы так,
+    #что зависимости компоненты всегда имеют меньшие номера
+    def strongly_connected_components(self):
+        if self.components is not None:
+            return self.components
+        count = len(self.names)
+        offsets, targets = self.offsets, self.targets
+        index = array("i", [-1]) * count #порядковый номер захода в пакет
+        low = array("i", [0]) * count
+        on_stack = bytearray(count)
+        component = array("i", [-1]) * count
+        stack = []
+        counter = 0
+        component_count = 0
+        for root in range(count):
+            if index[root] != -1:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [[root, offsets[root]]] #пакет и позиция следующего ребра
+            while work:
+                frame = work[-1]
+                node, position = frame
+                if position < offsets[node + 1]:
+                    frame[1] += 1
+                    target = targets[position]
+                    if index[target] == -1:
+                        index[target] = low[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack[target] = 1
+                        work.append([target, offsets[target]])
+                    elif on_stack[target] and index[target] < low[node]:
+                        low[node] = index[target]
+                    continue
+                work.pop()
+                if work and low[node] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[node]
+                if low[node] == index[node]: #node - корень компоненты
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        component[member] = component_count
+                        if member == node:
+                            break
+                    component_count += 1
+        self.components = component
+        self.component_count = component_count
+        self.component_members = None
+        return component
+
+    #пакеты каждой компоненты
+    def members(self, c):
+        if self.component_members is None:
+            self.component_members = [[] for _ in range(self.component_count)]
+            for node, node_component in enumerate(self.components):
+                self.component_members[node_component].append(node)
+        return self.component_members[c]
+
+    #компоненты, от которых зависит компонента c
+    def component_successors(self, c):
+        component = self.components
+        successors = set()
+        for node in self.members(c):
+            for target in self.targets[self.offsets[node]:self.offsets[node + 1]]:
+                if component[target] != c:
+                    successors.add(component[target])
+        return successors
+
+    #замыкание компоненты как битовое множество пакетов (int), memo хранит уже посчитанные компоненты
+    #замыкание компоненты - ее пакеты и замыкания компонент, от которых она зависит
+    def component_closure(self, c, memo):
+        stack = [c]
+        successors = {}
+        while stack:
+            top = stack[-1]
+            if top in memo:
+                stack.pop()
+                continue
+            if top not in successors:
+                successors[top] = self.component_successors(top)
+            missing = [successor for successor in successors[top] if successor not in memo]
+            if missing: #сначала считаем зависимости, граф компонент ациклический
+                stack.extend(missing)
+                continue
+            bits = 0
+            for node in self.members(top):
+                bits |= 1 << node
+            for successor in successors[top]:
+                bits |= memo[successor]
+            memo[top] = bits
+            stack.pop()
+        return memo[c]
+
+    #транзитивное сокращение графа компонент: ребро c -> d остается,
+    #только если d нельзя достичь из c через другие зависимости
+    #возвращает множество оставшихся ребер (c, d) между компонентами
+    def transitive_reduction(self):
+        self.strongly_connected_components()
+        reach = [0] * self.component_count #компоненты, достижимые из компоненты, битовое множество
+        kept = set()
+        for c in range(self.component_count): #зависимости компоненты посчитаны раньше нее
+            successors = self.component_successors(c)
+            covered = 0 #достижимо через какую-то зависимость
+            for successor in successors:
+                covered |= reach[successor]
+            bits = covered
+            for successor in successors:
+                bits |= 1 << successor
+                if not covered >> successor & 1:
+                    kept.add((c, successor))
+            reach[c] = bits
+        return kept
+
+    #циклы: компоненты из нескольких пакетов и пакеты, зависящие от самих себя
+    def cycles(self):
+        self.strongly_connected_components()
+        result = []
+        for c in range(self.component_count):
+            members = self.members(c)
+            if len(members) > 1 or members[0] in self.successors(members[0]):
+                result.append([self.names[node] for node in members])
+        return result
+
+    #число прямых зависимостей каждого пакета
+    def fan_out(self):
+        if "fan_out" not in self.analytics:
+            self.analytics["fan_out"] = array("I", map(operator.sub, self.offsets[1:], self.offsets[:-1]))
+        return self.analytics["fan_out"]
+
+    #число пакетов, которые зависят от каждого пакета напрямую
+    def fan_in(self):
+        if "fan_in" not in self.analytics:
+            counted = Counter(self.targets)
+            self.analytics["fan_in"] = array("I", map(counted.get, range(len(self.names)), repeat(0)))
+        return self.analytics["fan_in"]
+
+    #зависимости между компонентами: список множеств, считается одним проходом по ребрам
+    def component_edges(self):
+        if "component_edges" not in self.analytics:
+            component = self.strongly_connected_components()
+            edges = [set() for _ in range(self.component_count)]
+            for node in range(len(self.names)):
+                c = component[node]
+                for target in self.targets[self.offsets[node]:self.offsets[node + 1]]:
+                    if component[target] != c:
+                        edges[c].add(component[target])
+            self.analytics["component_edges"] = edges
+        return self.analytics["component_edges"]
+
+    #число пакетов, которые зависят от каждого пакета напрямую или транзитивно
+    #зависящие пакеты собираются в битовые множества по компонентам, начиная с тех, от кого никто не зависит;
+    #пакеты пронумерованы по убыванию номера компоненты, поэтому у зависящих младшие биты и множества короткие
+    def reverse_dependency_counts(self):
+        if "reverse_counts" in self.analytics:
+            return self.analytics["reverse_counts"]
+        component = self.strongly_connected_components()
+        edges = self.component_edges()
+        starts = array("I", bytes(4 * (self.component_count + 1))) #первый бит каждой компоненты
+        for c in range(self.component_count - 1, 0, -1):
+            starts[c - 1] = starts[c] + len(self.members(c))
+        pending = [0] * self.component_count #зависящие от компоненты, собранные от ее прямых потребителей
+        sizes = array("I", bytes(4 * self.component_count))
+        for c in range(self.component_count - 1, -1, -1):
+            bits = pending[c] | ((1 << len(self.members(c))) - 1) << starts[c]
+            pending[c] = None
+            sizes[c] = bits.bit_count()
+            for d in edges[c]:
+                pending[d] |= bits
+        counts = array("I", (sizes[c] - 1 for c in component))
+        self.analytics["reverse_counts"] = counts
+        return counts
+
+    #самые длинные цепочки зависимостей по графу компонент (цикл проходится как одно звено)
+    #length[c] - число звеньев в самой длинной цепочке от компоненты c, next_node[c] - следующий пакет цепочки
+    def longest_chains(self):
+        if "longest_chains" in self.analytics:
+            return self.analytics["longest_chains"]
+        component = self.strongly_connected_components()
+        length = array("I", [1]) * self.component_count
+        next_node = array("i", [-1]) * self.component_count
+        for c in range(self.component_count): #зависимости компоненты посчитаны раньше нее
+            for node in self.members(c):
+                for target in self.targets[self.offsets[node]:self.offsets[node + 1]]:
+                    d = component[target]
+                    if d != c and length[d] + 1 > length[c]:
+                        length[c] = length[d] + 1
+                        next_node[c] = target
+        self.analytics["longest_chains"] = (length, next_node)
+        return length, next_node
+
+    #самая длинная цепочка от пакета root, без root - самая длинная во всем индексе
+    def longest_chain(self, root=None):
+        length, next_node = self.longest_chains()
+        component = self.strongly_connected_components()
+        if root is None:
+            best = max(range(self.component_count), key=length.__getitem__, default=None)
+            if best is None:
+                return []
+            node = self.members(best)[0]
+        else:
+            node = self.ids[root]
+        chain = [self.names[node]]
+        while next_node[component[node]] != -1:
+            node = next_node[component[node]]
+            chain.append(self.names[node])
+        return chain
+
+    #обход в ширину от root с родителем каждого пакета: (уровни, родители), результат запоминается
+    def bfs_tree(self, root):
+        if root in self.bfs_cache:
+            self.bfs_cache.move_to_end(root) #недавно использованный обход
+            return self.bfs_cache[root]
+        start = self.ids[root]
+        parent = array("i", [-1]) * len(self.names)
+        parent[start] = start
+        offsets, targets = self.offsets, self.targets
+        levels = []
+        frontier = [start]
+        while frontier:
+            levels.append(frontier)
+            next_frontier = []
+            for current in frontier:
+                for target in targets[offsets[current]:offsets[current + 1]]:
+                    if parent[target] == -1:
+                        parent[target] = current
+                        next_frontier.append(target)
+            frontier = next_frontier
+        self.bfs_cache[root] = (levels, parent)
+        if len(self.bfs_cache) > self.bfs_cache_size: #выкидываем самый старый обход
+            self.bfs_cache.popitem(last=False)
+        return levels, parent
+
+    #сколько пакетов на каждом уровне глубины от root
+    def depth_histogram(self, root):
+        levels, _ = self.bfs_tree(root)
+        return [len(level) for level in levels]
+
+    #кратчайшая цепочка зависимостей от source до target, None если target недостижим
+    def shortest_path(self, source, target):
+        _, parent = self.bfs_tree(source)
+        node = self.ids[target]
+        if parent[node] == -1:
+            return None
+        path = [node]
+        while path[-1] != parent[path[-1]]:
+            path.append(parent[path[-1]])
+        return [self.names[i] for i in reversed(path)]
+
+    #первые top пакетов по значению метрики
+    def ranking(self, values, top):
+        order = heapq.nlargest(top, range(len(values)), key=values.__getitem__)
+        return [(self.names[i], values[i]) for i in order]
+
+    #замыкания для многих пакетов с общими промежуточными результатами
+    #возвращает словарь пакет -> список номеров пакетов замыкания
+    def closures(self, roots, memo=None):
+        component = self.strongly_connected_components()
+        memo = {} if memo is None else memo
+        result = {}
+        for root in roots:
+            bits = self.component_closure(component[self.ids[root]], memo)
+            digits = bin(bits)[:1:-1] #младший бит первым
+            result[root] = [i for i, digit in enumerate(digits) if digit == "1"]
+        return result
+
+
+#открытие файла программой по умолчанию: startfile на windows, open на macos, xdg-open на остальных
+def open_file(path):
+    if sys.platform == "win32":
+        os.startfile(path)
+    elif sys.platform == "darwin":
+        subprocess.run(["open", path], check=False)
+    elif shutil.which("xdg-open"):
+        subprocess.Popen(["xdg-open", path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        print(f"no program to open {path}", file=sys.stderr)
+
+
+#отрисовка диаграммы: source_format - в каком формате визуализатор пишет исходник диаграммы,
+#extension - расширение результата по умолчанию
+class Renderer(ABC):
+    name = None
+    source_format = None
+    extension = ".png"
+
+    def available(self):
+        return True
+
+    @abstractmethod
+    def render(self, source_path, output_path):
+        pass
+
+
+#mermaid-cli (mmdc), формат результата - по расширению output_path
+class MermaidRenderer(Renderer):
+    name = "mmdc"
+    source_format = "mermaid"
+
+    def __init__(self, path="mmdc"):
+        self.path = path
+
+    def available(self):
+        return shutil.which(self.path) is not None
+
+    def render(self, source_path, output_path):
+        subprocess.run([self.path, "-i", source_path, "-o", output_path], check=True)
+
+
+#graphviz dot, формат результата - по расширению output_path (png, svg, pdf)
+class GraphvizRenderer(Renderer):
+    name = "dot"
+    source_format = "dot"
+
+    def __init__(self, path="dot"):
+        self.path = path
+
+    def available(self):
+        return shutil.which(self.path) is not None
+
+    def render(self, source_path, output_path):
+        output_format = os.path.splitext(output_path)[1].lstrip(".") or "png"
+        subprocess.run([self.path, "-T" + output_format, source_path, "-o", output_path], check=True)
+
+
+#svg без внешних программ: слои по самому длинному пути в графе компонент,
+#порядок внутри слоя - по среднему положению пакетов предыдущего слоя, которые от него зависят
+class SvgRenderer(Renderer):
+    name = "svg"
+    source_format = "json"
+    extension = ".svg"
+    LAYER_HEIGHT = 90
+    NODE_HEIGHT = 30
+    GAP = 20
+    CHAR_WIDTH = 7
+
+    def render(self, source_path, output_path):
+        if not output_path.endswith(".svg"):
+            raise ValueError(f"svg renderer writes only .svg files: {output_path}")
+        with open(source_path, "r", encoding="utf-8") as f:
+            diagram = json.load(f)
+        labels = diagram["nodes"]
+        positions, width, height = self.layout(diagram["edges"], labels)
+        with open(output_path, "w", encoding="utf-8") as out:
+            out.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                      f'font-family="sans-serif" font-size="12">\n')
+            out.write('<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="8" '
+                      'markerHeight="8" orient="auto"><path d="M0,0 L10,5 L0,10 z"/></marker></defs>\n')
+            for source, target in diagram["edges"]:
+                (x1, y1, _), (x2, y2, _) = positions[source], positions[target]
+                if y1 == y2: #ребро внутри цикла, узлы на одном слое
+                    out.write(f'<path d="M{x1},{y1} Q{(x1 + x2) / 2},{y1 - self.LAYER_HEIGHT / 2} {x2},{y2 - self.NODE_HEIGHT / 2}" '
+                              f'fill="none" stroke="#555" marker-end="url(#arrow)"/>\n')
+                else:
+                    out.write(f'<line x1="{x1}" y1="{y1 + self.NODE_HEIGHT / 2}" x2="{x2}" y2="{y2 - self.NODE_HEIGHT / 2}" '
+                              f'stroke="#555" marker-end="url(#arrow)"/>\n')
+            for node, (x, y, node_width) in positions.items():
+                out.write(f'<rect x="{x - node_width / 2}" y="{y - self.NODE_HEIGHT / 2}" width="{node_width}" '
+                          f'height="{self.NODE_HEIGHT}" rx="5" fill="#ececff" stroke="#9370db"/>\n')
+                out.write(f'<text x="{x}" y="{y + 4}" text-anchor="middle">{html.escape(labels.get(node, node))}</text>\n')
+            out.write("</svg>\n")
+
+    #координаты центров узлов и их ширина: узел -> (x, y, ширина), и размер картинки
+    def layout(self, edges, labels):
+        adjacency = defaultdict(list)
+        for source, target in edges:
+            adjacency[source].append(target)
+        for node in labels:
+            adjacency.setdefault(node, [])
+        graph = DependencyGraph(adjacency)
+        component = graph.strongly_connected_components()
+        layer_of = array("I", bytes(4 * graph.component_count))
+        for c in range(graph.component_count - 1, -1, -1): #зависящие компоненты имеют большие номера
+            for d in graph.component_edges()[c]:
+                layer_of[d] = max(layer_of[d], layer_of[c] + 1)
+
+        layers = defaultdict(list)
+        for node in range(len(graph)):
+            layers[layer_of[component[node]]].append(node)
+        predecessors = graph.reverse()
+        positions = {}
+        width = 0
+        order = {} #позиция пакета внутри своего слоя
+        for layer in range(len(layers)):
+            nodes = layers[layer]
+            nodes.sort(key=lambda node: self.barycenter(predecessors.successors(node), order))
+            x = self.GAP
+            for i, node in enumerate(nodes):
+                name = graph.names[node]
+                node_width = self.CHAR_WIDTH * len(labels.get(name, name)) + 2 * self.GAP
+                positions[name] = (x + node_width / 2, self.GAP + self.NODE_HEIGHT / 2 + layer * self.LAYER_HEIGHT, node_width)
+                x += node_width + self.GAP
+                order[node] = i
+            width = max(width, x)
+        height = 2 * self.GAP + self.NODE_HEIGHT + max(len(layers) - 1, 0) * self.LAYER_HEIGHT
+        return positions, width, height
+
+    #среднее положение уже размещенных пакетов, 0 если таких нет
+    def barycenter(self, nodes, order):
+        placed = [order[node] for node in nodes if node in order]
+        return sum(placed) / len(placed) if placed else 0
+
+
 class DependencyVisualizer:
+    #поля связей, которые разбираются из файла Packages
+    RELATION_FIELDS = ("Pre-Depends", "Depends", "Recommends", "Provides")
+    #альтернатива: имя[:архитектура] [(отношение версия)] [[архитектуры]] [<профили>]
+    PATTERN_PACKAGE = re.compile(r"^Package:\s*(\S+)", re.M)
+    PATTERN_RELATION = re.compile(r"\s*([^\s(:\[<]+)(?::\S+)?\s*(?:\(\s*([<>=]+)\s*([^)\s]+)\s*\))?")
+
     def __init__(self, config_path):
         self.config = self.load_config(config_path)
         self.package = self.config["package"]
         self.repo_url = self.config["repo_url"]
+        #несколько индексов (main, contrib, security, архитектуры) задаются списком, при совпадении имен пакетов
+        #побеждает источник, указанный раньше
+        self.sources = self.repo_url if isinstance(self.repo_url, list) else [self.repo_url]
         self.visualizer_path = self.config["visualizer_path"]
+        #чем рисовать граф: mmdc, dot, svg (без внешних программ) или auto - первый доступный
+        self.renderer = self.config.get("renderer", "auto")
+        self.open_result = self.config.get("open_result", True) #открывать ли картинку после отрисовки
+        self.cache_dir = self.config.get("cache_dir") #каталог кэша разобранного индекса, без него кэш выключен
+        #какие поля считаются зависимостями при построении графа
+        self.dependency_fields = self.config.get("dependency_fields", ["Depends"])
+        #граф больше этого числа узлов не рисуется целиком, а сворачивается
+        self.max_nodes = self.config.get("max_nodes", 300)
+        #обновление кэша по Packages.diff вместо скачивания всего индекса
+        self.incremental = self.config.get("incremental", False)
         self.dependencies = defaultdict(list)
+        self.graph = None #граф всего индекса для запросов analyze
+        #одна сессия на все загрузки: соединения с сервером переиспользуются
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.sources), pool_maxsize=len(self.sources))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
     #функция загрузки yaml-файла
     def load_config(self, path):
@@ -21,84 +728,771 @@ class DependencyVisualizer:
 
     #функция загрузки списка пакетов и зависимостей из репозитория
     def load_data(self):
-           response = requests.get(self.repo_url, stream=True)
-           if response.status_code != 200:
-               print(f"error fetching package list from {self.repo_url}", file=sys.stderr)
-               sys.exit(1)
-
-            #распаковка gzip и парсинг файла
-           package_data = {}
-           f = gzip.open(response.raw, encoding="utf-8", mode="rt")
-           #проходим по каждой строке
-           for line in f:
-               line = line.strip()
-               if line.startswith("Package:"):
-                   #рассмотрение текущего пакета
-                   current_package = line.split(":", 1)[1].strip()
-               elif line.startswith("Depends:") and current_package:
-                   #зависимости текущего пакета
-                   depends_raw = line.split(":", 1)[1].strip()
-                   dependencies = [
-                       dep.split("|")[0].strip().split()[0].strip()  #убираем альтернативные зависимости
-                       for dep in depends_raw.split(",")
-                   ]
-                   package_data[current_package] = dependencies
-           return package_data
+        if self.cache_dir:
+            return self.load_cached_data()
+        return self.load_sources()
+
+    #параллельная загрузка и разбор всех источников, время близко ко времени самого медленного из них
+    #responses - уже полученные ответы сервера для источников (None - открыть заново)
+    def load_sources(self, responses=None):
+        responses = responses or [None] * len(self.sources)
+        with ThreadPoolExecutor(max_workers=len(self.sources)) as pool:
+            sources = list(pool.map(self.read_source, self.sources, responses))
+        return self.merge_records(sources)
+
+    #записи о пакетах одного источника
+    def read_source(self, url, response=None):
+        with self.open_source(url, response) as f:
+            return list(self.parse_stanzas(f))
+
+    #путь к локальному файлу для file:// url или обычного пути, None для сетевого адреса
+    def local_path(self, url):
+        parsed = urlparse(url)
+        if parsed.scheme == "file":
+            return url2pathname(parsed.path)
+        if parsed.scheme in ("http", "https"):
+            return None
+        return url
+
+    #распаковка потока по расширению файла
+    def decompress(self, url, raw):
+        if url.endswith(".gz"):
+            return gzip.open(raw, encoding="utf-8", mode="rt")
+        if url.endswith(".xz"):
+            return lzma.open(raw, encoding="utf-8", mode="rt")
+        return io.TextIOWrapper(raw, encoding="utf-8")
+
+    #открытие индекса пакетов из сети или с диска
+    def open_source(self, url, response=None):
+        path = self.local_path(url)
+        if path is not None:
+            return self.decompress(url, open(path, "rb"))
+        if response is None:
+            response = self.session.get(url, stream=True)
+        if response.status_code != 200:
+            print(f"error fetching package list from {url}", file=sys.stderr)
+            sys.exit(1)
+        return self.decompress(url, response.raw)
+
+    #объединение записей нескольких источников в один словарь пакет -> зависимости
+    #пакет из более раннего источника не перекрывается, альтернативы выбираются по всем источникам сразу
+    def merge_records(self, sources):
+        return self.resolve_dependencies(*self.collect_records(sources))
+
+    #записи всех источников и виртуальные пакеты: (имя -> запись, виртуальный пакет -> пакеты)
+    def collect_records(self, sources):
+        records = {}
+        provides = defaultdict(list) #виртуальный пакет -> пакеты, которые его предоставляют
+        for source in sources:
+            seen = set()
+            for record in source:
+                if record.name in records and record.name not in seen:
+                    continue
+                seen.add(record.name)
+                records[record.name] = record
+                for name, _, _ in record.provides:
+                    provides[name].append(record.name)
+        return records, provides
+
+    #потоковый разбор файла Packages по абзацам, за один проход
+    #строки, начинающиеся с пробела, продолжают предыдущее поле
+    def parse_stanzas(self, f):
+        fields = {}
+        field = None
+        for line in f:
+            if line[:1] in (" ", "\t"): #продолжение поля
+                if field is not None:
+                    fields[field] += " " + line.strip()
+                continue
+            line = line.rstrip("\n")
+            if not line.strip(): #пустая строка - конец абзаца
+                if "Package" in fields:
+                    yield self.make_record(fields)
+                fields = {}
+                field = None
+                continue
+            name, _, value = line.partition(":")
+            if name == "Package" or name == "Version" or name in self.RELATION_FIELDS:
+                field = name
+                fields[name] = value.strip()
+            else:
+                field = None #остальные поля (и их продолжения) не нужны
+        if "Package" in fields:
+            yield self.make_record(fields)
+
+    def make_record(self, fields):
+        relations = {}
+        for field in self.RELATION_FIELDS:
+            if field != "Provides" and fields.get(field):
+                relations[sys.intern(field)] = self.parse_relations(fields[field])
+        provides = tuple(group[0] for group in self.parse_relations(fields.get("Provides", "")))
+        return PackageRecord(sys.intern(fields["Package"]), fields.get("Version"), relations, provides)
+
+    #разбор поля связей: группы через запятую, альтернативы через |
+    def parse_relations(self, text):
+        groups = []
+        for group in text.split(","):
+            alternatives = []
+            for alternative in group.split("|"):
+                match = self.PATTERN_RELATION.match(alternative)
+                if match:
+                    name, relation, version = match.groups()
+                    alternatives.append((sys.intern(name), relation, version))
+            if alternatives:
+                groups.append(tuple(alternatives))
+        return tuple(groups)
+
+    #выбор пакета для группы альтернатив: первый существующий пакет,
+    #для виртуального пакета - первый пакет, который его предоставляет
+    def choose_alternative(self, group, records, provides):
+        for name, _, _ in group:
+            if name in records:
+                return name
+            if name in provides:
+                return provides[name][0]
+        return group[0][0] #пакета нет в индексе, оставляем первую альтернативу
+
+    #словарь пакет -> зависимости для графа по полям dependency_fields
+    #пакеты без зависимостей тоже хранятся, чтобы отличать их от неизвестных имен
+    def resolve_dependencies(self, records, provides):
+        return {name: self.record_dependencies(record, records, provides) for name, record in records.items()}
+
+    #зависимости одного пакета, records нужен только для проверки, есть ли пакет в индексе
+    def record_dependencies(self, record, records, provides):
+        dependencies = []
+        for field in self.dependency_fields:
+            for group in record.relations.get(field, ()):
+                dependency = self.choose_alternative(group, records, provides)
+                if dependency not in dependencies:
+                    dependencies.append(dependency)
+        return dependencies
+
+    #хэш содержимого файла
+    def file_hash(self, path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    #загрузка индекса через кэш: при неизменных источниках файлы не скачиваются и не разбираются
+    #ключ кэша - список url, актуальность проверяется по ETag/Last-Modified или по хэшу локального файла
+    def load_cached_data(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        index_path = self.cache_path(".pkgc")
+        meta_path = self.cache_path(".json")
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        cached = (os.path.exists(index_path) and meta.get("urls") == self.sources
+                  and meta.get("version") == PackageIndex.VERSION)
+        old_meta = meta.get("sources", [{}] * len(self.sources)) if cached else [{}] * len(self.sources)
+
+        #источники проверяются параллельно
+        with ThreadPoolExecutor(max_workers=len(self.sources)) as pool:
+            checks = list(pool.map(self.check_source, self.sources, old_meta))
+        if cached and all(valid for valid, _, _ in checks):
+            return PackageIndex(index_path)
+        new_meta = {"urls": self.sources, "version": PackageIndex.VERSION,
+                    "sources": [source_meta for _, source_meta, _ in checks]}
+        if self.incremental:
+            package_data, new_meta["provides"] = self.update_index(meta if cached else {}, checks)
+        else:
+            #ответ 304 без тела, такой источник скачивается заново
+            responses = [None if valid else response for valid, _, response in checks]
+            package_data = self.load_sources(responses)
+            self.save_closures({}, replace=True) #индекс построен заново, прежние замыкания не годятся
+        PackageIndex.write(index_path, package_data)
+        with open(meta_path, "w") as f:
+            json.dump(new_meta, f)
+        return package_data
+
+    #путь к файлу кэша: ключ - источники и поля зависимостей, от них зависит содержимое индекса
+    def cache_path(self, suffix):
+        key_source = "|".join(self.sources) + "|" + ",".join(self.dependency_fields)
+        key = hashlib.sha256(key_source.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, key + suffix)
+
+    #проверка одного источника по сохраненным метаданным: (не изменился ли, новые метаданные, ответ сервера)
+    def check_source(self, url, meta):
+        path = self.local_path(url)
+        if path is not None:
+            new_meta = {"url": url, "sha256": self.file_hash(path)}
+            return meta.get("sha256") == new_meta["sha256"], new_meta, None
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        response = self.session.get(url, stream=True, headers=headers)
+        if response.status_code == 304:
+            return True, meta, response #источник не изменился, метаданные прежние
+        new_meta = {"url": url, "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified")}
+        return False, new_meta, response
+
+    #инкрементальное обновление: исходные файлы Packages хранятся в кэше и обновляются по pdiff,
+    #заново разбираются только изменившиеся пакеты и пакеты, которые на них ссылаются
+    #возвращает (пакет -> зависимости, виртуальный пакет -> пакеты)
+    def update_index(self, meta, checks):
+        raw_paths = [self.cache_path(f".{i}.packages") for i in range(len(self.sources))]
+        old_texts = []
+        for path in raw_paths:
+            try:
+                with open(path, "r", encoding="utf-8", newline="") as f:
+                    old_texts.append(f.read())
+            except OSError:
+                old_texts.append(None)
+        with ThreadPoolExecutor(max_workers=len(self.sources)) as pool:
+            new_texts = list(pool.map(self.refresh_source, self.sources, old_texts, checks))
+        for path, old_text, new_text in zip(raw_paths, old_texts, new_texts):
+            if new_text is not old_text:
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                with open(temp_path, "w", encoding="utf-8", newline="") as f:
+                    f.write(new_text)
+                os.replace(temp_path, path)
+
+        if "provides" not in meta or None in old_texts: #обновлять нечего, индекс строится целиком
+            records, provides = self.collect_records(self.parse_stanzas(io.StringIO(text)) for text in new_texts)
+            self.save_closures({}, replace=True)
+            return self.resolve_dependencies(records, provides), provides
+
+        old_stanzas = self.merge_stanzas(old_texts)
+        new_stanzas = self.merge_stanzas(new_texts)
+        changed = {name for name in old_stanzas.keys() | new_stanzas.keys()
+                   if old_stanzas.get(name) != new_stanzas.get(name)}
+        index = PackageIndex(self.cache_path(".pkgc"))
+        package_data = dict(index.items())
+        index.close()
+        provides = meta["provides"]
+        if not changed:
+            return package_data, provides
+
+        old_records = self.parse_named(old_stanzas, changed)
+        new_records = self.parse_named(new_stanzas, changed)
+        #имена, от которых зависит выбор альтернатив: появившиеся и исчезнувшие пакеты
+        #и виртуальные пакеты, у которых изменился список предоставляющих
+        dirty = {name for name in changed if (name in old_stanzas) != (name in new_stanzas)}
+        virtuals = {name for record in old_records.values() for name, _, _ in record.provides}
+        virtuals.update(name for record in new_records.values() for name, _, _ in record.provides)
+        rank = {name: i for i, name in enumerate(new_stanzas)}
+        for virtual in virtuals:
+            providers = [name for name in provides.get(virtual, ()) if name not in changed]
+            providers.extend(name for name, record in new_records.items()
+                             if any(provided == virtual for provided, _, _ in record.provides))
+            providers.sort(key=rank.__getitem__) #порядок как при полном разборе
+            if providers != provides.get(virtual, []):
+                dirty.add(virtual)
+                if providers:
+                    provides[virtual] = providers
+                else:
+                    del provides[virtual]
+
+        #пакеты, в тексте которых встречаются такие имена, разбираются заново (с запасом)
+        if dirty:
+            pattern = re.compile(r"(?<![\w.+-])(?:" + "|".join(map(re.escape, dirty)) + r")(?![\w.+-])")
+            affected = {name for name, stanza in new_stanzas.items() if pattern.search(stanza)}
+            new_records.update(self.parse_named(new_stanzas, affected - new_records.keys()))
+
+        updated = set()
+        for name in changed - new_stanzas.keys():
+            package_data.pop(name, None)
+            updated.add(name)
+        for name, record in new_records.items():
+            dependencies = self.record_dependencies(record, new_stanzas, provides)
+            if dependencies != package_data.get(name):
+                updated.add(name)
+            package_data[name] = dependencies
+        self.invalidate_closures(updated)
+        return package_data, provides
+
+    #новый текст файла Packages одного источника: прежний, обновленный по pdiff или скачанный целиком
+    def refresh_source(self, url, text, check):
+        valid, _, response = check
+        if text is not None and valid:
+            return text
+        if text is not None:
+            patched = self.patch_source(url, text)
+            if patched is not None:
+                if response is not None:
+                    response.close()
+                return patched
+        with self.open_source(url, None if valid else response) as f:
+            return f.read()
+
+    #абзацы файлов Packages по именам пакетов, пакет из более раннего источника не перекрывается
+    def merge_stanzas(self, texts):
+        merged = {}
+        for text in texts:
+            stanzas = {}
+            for stanza in text.split("\n\n"):
+                match = self.PATTERN_PACKAGE.search(stanza)
+                if match:
+                    stanzas[match.group(1)] = stanza
+            for name, stanza in stanzas.items():
+                if name not in merged:
+                    merged[name] = stanza
+        return merged
+
+    #разбор абзацев только для указанных пакетов
+    def parse_named(self, stanzas, names):
+        text = "\n\n".join(stanzas[name] for name in names if name in stanzas)
+        return {record.name: record for record in self.parse_stanzas(io.StringIO(text))}
+
+    #применение pdiff из каталога Packages.diff рядом с источником к сохраненному тексту
+    #None, если подходящей цепочки диффов нет и индекс нужно скачать целиком
+    def patch_source(self, url, text):
+        data = self.fetch_bytes(self.diff_url(url, "Index"))
+        if data is None:
+            return None
+        fields = self.parse_diff_index(data.decode("utf-8"))
+        current = fields.get("SHA256-Current", "").split()[:1]
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if current == [digest]:
+            return text
+        history = fields.get("SHA256-History", [])
+        hashes = [entry[0] for entry in history]
+        if not current or digest not in hashes:
+            print(f"no pdiff chain for {url}, downloading full index", file=sys.stderr)
+            return None
+        expected = {name: patch_hash for patch_hash, _, name in fields.get("SHA256-Patches", [])}
+        lines = text.splitlines(keepends=True)
+        for _, _, name in history[hashes.index(digest):]:
+            data = self.fetch_bytes(self.diff_url(url, name + ".gz"))
+            if data is None:
+                return None
+            patch = gzip.decompress(data)
+            if name in expected and hashlib.sha256(patch).hexdigest() != expected[name]:
+                print(f"pdiff {name} for {url} is corrupted, downloading full index", file=sys.stderr)
+                return None
+            try:
+                lines = apply_ed_diff(lines, patch.decode("utf-8").splitlines(keepends=True))
+            except ValueError as e:
+                print(f"pdiff {name} for {url}: {e}, downloading full index", file=sys.stderr)
+                return None
+        text = "".join(lines)
+        if hashlib.sha256(text.encode("utf-8")).hexdigest() != current[0]:
+            print(f"pdiff result for {url} does not match, downloading full index", file=sys.stderr)
+            return None
+        return text
+
+    #разбор Packages.diff/Index: поле -> значение или список (хэш, размер, имя) для многострочных полей
+    def parse_diff_index(self, text):
+        fields = {}
+        field = None
+        for line in text.splitlines():
+            if line[:1] == " " and field is not None:
+                digest, size, name = line.split()
+                fields[field].append((digest, int(size), name))
+                continue
+            field, _, value = line.partition(":")
+            fields[field] = value.strip() or []
+        return fields
 
+    #адрес файла в каталоге Packages.diff рядом с файлом Packages
+    def diff_url(self, url, name):
+        path = self.local_path(url)
+        if path is not None:
+            return os.path.join(os.path.dirname(path), "Packages.diff", name)
+        return urljoin(url, "Packages.diff/" + name)
+
+    #содержимое файла по адресу или пути, None если его нет
+    def fetch_bytes(self, url):
+        path = self.local_path(url)
+        if path is not None:
+            try:
+                with open(path, "rb") as f:
+                    return f.read()
+            except OSError:
+                return None
+        response = self.session.get(url)
+        return response.content if response.status_code == 200 else None
+
+    #сохраненные замыкания пакетного режима: пакет -> результат
+    def load_closures(self):
+        if not self.cache_dir:
+            return {}
+        try:
+            with open(self.cache_path(".closures.json"), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    #добавление замыканий в кэш, replace - заменить все сохраненные
+    def save_closures(self, closures, replace=False):
+        if not self.cache_dir:
+            return
+        stored = {} if replace else self.load_closures()
+        stored.update(closures)
+        path = self.cache_path(".closures.json")
+        with open(f"{path}.{os.getpid()}.tmp", "w") as f:
+            json.dump(stored, f)
+        os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+    #удаление замыканий, в которые входит хотя бы один изменившийся пакет
+    def invalidate_closures(self, changed):
+        stored = self.load_closures()
+        kept = {root: summary for root, summary in stored.items()
+                if root not in changed and changed.isdisjoint(summary["dependencies"])}
+        if len(kept) != len(stored):
+            self.save_closures(kept, replace=True)
+
+
+    #граф зависимостей всего индекса для обходов и запросов по многим пакетам
+    def load_graph(self):
+        return DependencyGraph(self.load_data())
+
+    #запросы к графу всего индекса: каждая метрика считается один раз для всех пакетов и запоминается
+    #packages - пакеты запроса, без них для метрик выводятся первые top пакетов
+    def analyze(self, query, packages=(), top=20):
+        if self.graph is None:
+            self.graph = self.load_graph()
+        graph = self.graph
+        if query == "depth" and not packages:
+            packages = [self.package]
+        #в графе есть все пакеты индекса, в том числе без зависимостей
+        missing = [name for name in packages if name not in graph.ids]
+        if missing:
+            return {"error": "package not found", "packages": missing}
+        metrics = {"fan-in": graph.fan_in, "fan-out": graph.fan_out, "reverse-counts": graph.reverse_dependency_counts}
+        if query in metrics:
+            values = metrics[query]()
+            if packages:
+                return {name: values[graph.ids[name]] for name in packages}
+            return graph.ranking(values, top)
+        if query == "longest-chain":
+            chain = graph.longest_chain(packages[0] if packages else None)
+            return {"length": len(chain), "chain": chain}
+        if query == "depth":
+            root = packages[0]
+            return {"package": root, "levels": graph.depth_histogram(root)}
+        if query == "path":
+            if len(packages) != 2:
+                return {"error": "path needs two packages"}
+            return {"path": graph.shortest_path(*packages)}
+        raise ValueError(f"unknown query: {query}")
 
     #функция получения всех зависимостей необходимого пакетв
-    def build_dependency_graph(self):
+    #max_depth ограничивает глубину: зависимости пакетов на этой глубине не раскрываются
+    def build_dependency_graph(self, max_depth=None):
         metadata = self.load_data()
-        visited = set()
-        queue = [self.package] #очередь на определение зависимостей пакетов
+        visited = {self.package}
+        queue = deque([(self.package, 0)]) #очередь на определение зависимостей пакетов
 
         while queue:
-            #удаляем из очереди первый элемент и проверяем, определяли ли для него зависимость
-            current = queue.pop(0)
-            if current in visited:
-                continue
-            visited.add(current)
-
-            if current in metadata:
-                dependencies = metadata[current]
+            #удаляем из очереди первый элемент
+            current, depth = queue.popleft()
+            dependencies = metadata.get(current)
+            if dependencies and (max_depth is None or depth < max_depth):
                 self.dependencies[current] = dependencies
                 #добавляем все зависимые пакеты в очередь
                 for dep in dependencies:
                     if dep not in visited:
-                        queue.append(dep)
+                        visited.add(dep)
+                        queue.append((dep, depth + 1))
 
     #функция преобразования списка зависимостей в синтаксис диаграммы mermaid
-    def generate_mermaid_diagram(self):
-        lines = ["graph TD"] #определяем диаграмму mermaid сверху-вниз
-        #зпаисываем каждую зависимость в lines
+    #collapse_cycles - каждый цикл рисуется одним узлом, reduce - убираются ребра, следующие из других путей
+    def generate_mermaid_diagram(self, collapse_cycles=False, reduce=False):
+        out = io.StringIO()
+        self.write_mermaid(out, *self.diagram(collapse_cycles, reduce))
+        return out.getvalue().rstrip("\n")
+
+    #потоковая запись диаграммы: ребра пишутся сразу в файл, без сборки всей диаграммы в памяти
+    #не зависит от состояния визуализатора, поэтому вызывается и из процессов пакетного режима
+    @staticmethod
+    def write_mermaid(out, nodes, edges):
+        out.write("graph TD\n") #определяем диаграмму mermaid сверху-вниз
+        for node, label in nodes: #узлы со своими подписями (свернутые циклы)
+            out.write(f'    {node}["{label}"]\n')
+        for package, dep in edges:
+            out.write(f"    {package} --> {dep}\n")
+
+    def write_dot(self, out, nodes, edges):
+        out.write("digraph dependencies {\n")
+        for node, label in nodes:
+            out.write(f"    {json.dumps(node)} [label={json.dumps(label)}];\n")
+        for package, dep in edges:
+            out.write(f"    {json.dumps(package)} -> {json.dumps(dep)};\n")
+        out.write("}\n")
+
+    #список ребер в json: {"nodes": {узел: подпись}, "edges": [[откуда, куда], ...]}
+    def write_json(self, out, nodes, edges):
+        out.write('{"nodes": ' + json.dumps(dict(nodes)) + ', "edges": [')
+        separator = "\n"
+        for edge in edges:
+            out.write(separator + json.dumps(edge))
+            separator = ",\n"
+        out.write("\n]}\n")
+
+    #запись диаграммы в выбранном формате с защитой от слишком больших графов
+    def write_diagram(self, out, output_format="mermaid", collapse_cycles=False, reduce=False):
+        writers = {"mermaid": self.write_mermaid, "dot": self.write_dot, "json": self.write_json}
+        writers[output_format](out, *self.diagram_for_output(collapse_cycles, reduce))
+
+    #диаграмма, которую еще можно отрисовать: если узлов больше max_nodes, циклы сворачиваются
+    #и лишние ребра убираются, а если и этого мало - граф обрезается по глубине
+    def diagram_for_output(self, collapse_cycles=False, reduce=False):
+        packages = set(self.dependencies)
+        for deps in self.dependencies.values():
+            packages.update(deps)
+        if len(packages) <= self.max_nodes:
+            return self.diagram(collapse_cycles, reduce)
+        print(f"graph has {len(packages)} nodes (limit {self.max_nodes}), simplifying", file=sys.stderr)
+        nodes, edges = self.diagram(collapse_cycles=True, reduce=True)
+        edges = list(edges)
+        shown = {node for edge in edges for node in edge}
+        if len(shown) <= self.max_nodes:
+            return nodes, edges
+        return self.summary_diagram()
+
+    #сокращенная диаграмма: пакеты до глубины, на которой их вместе с узлами "+N more" не больше max_nodes,
+    #у пакетов на границе скрытые зависимости показываются одним узлом с их количеством
+    def summary_diagram(self):
+        depths = {self.package: 0}
+        levels = [[self.package]]
+        while levels[-1]:
+            level = []
+            for package in levels[-1]:
+                for dep in self.dependencies.get(package, ()):
+                    if dep not in depths:
+                        depths[dep] = len(levels)
+                        level.append(dep)
+            levels.append(level)
+        #узел "+N more" нужен пакету на глубине d, пока d меньше глубины его самой глубокой зависимости:
+        #more[d] - сколько таких узлов при обрезке на глубине d, считается разностным массивом
+        more = [0] * (len(levels) + 1)
+        for package, depth in depths.items():
+            deepest = max((depths[dep] for dep in self.dependencies.get(package, ())), default=0)
+            if deepest > depth:
+                more[depth] += 1
+                more[deepest] -= 1
+        for depth in range(1, len(more)):
+            more[depth] += more[depth - 1]
+        #самая большая глубина, при которой пакеты вместе с узлами "+N more" укладываются в max_nodes
+        max_depth, count = 0, 1
+        while max_depth + 1 < len(levels) and count + len(levels[max_depth + 1]) + more[max_depth + 1] <= self.max_nodes:
+            max_depth += 1
+            count += len(levels[max_depth])
+
+        nodes, edges = [], []
+        for package, deps in self.dependencies.items():
+            if depths.get(package, max_depth + 1) > max_depth:
+                continue
+            hidden = 0
+            for dep in deps:
+                if depths[dep] <= max_depth:
+                    edges.append((package, dep))
+                else:
+                    hidden += 1
+            if hidden:
+                node = f"MORE{len(nodes)}"
+                nodes.append((node, f"+{hidden} more"))
+                edges.append((package, node))
+        return nodes, edges
+
+    #узлы с подписями и ребра диаграммы
+    def diagram(self, collapse_cycles=False, reduce=False):
+        if not collapse_cycles and not reduce:
+            edges = ((package, dep) for package, deps in self.dependencies.items() for dep in deps)
+            return [], edges
+        graph = DependencyGraph(self.dependencies)
+        component = graph.strongly_connected_components()
+        kept = graph.transitive_reduction() if reduce else None
+        nodes = []
+        cycle_names = {} #компонента -> имя узла свернутого цикла
+        if collapse_cycles:
+            for members in graph.cycles():
+                c = component[graph.ids[members[0]]]
+                if len(members) > 1:
+                    cycle_names[c] = f"SCC{len(cycle_names)}" #имена пакетов debian не бывают в верхнем регистре
+                    nodes.append((cycle_names[c], ", ".join(members)))
+
+        edges = []
+        seen = set()
         for package, deps in self.dependencies.items():
+            source = component[graph.ids[package]]
             for dep in deps:
-                lines.append(f"    {package} --> {dep}")
-        return "\n".join(lines) #объединяем и возвращаем
+                target = component[graph.ids[dep]]
+                if source == target:
+                    if collapse_cycles and source in cycle_names: #ребро внутри свернутого цикла
+                        continue
+                elif kept is not None and (source, target) not in kept:
+                    continue
+                edge = (cycle_names.get(source, package), cycle_names.get(target, dep))
+                if edge not in seen:
+                    seen.add(edge)
+                    edges.append(edge)
+        return nodes, edges
+
+    #циклы в графе зависимостей пакета
+    def find_cycles(self):
+        return DependencyGraph(self.dependencies).cycles()
+
+    #выбор способа отрисовки по настройке renderer
+    def make_renderer(self):
+        renderers = [MermaidRenderer(self.visualizer_path), GraphvizRenderer(), SvgRenderer()]
+        if self.renderer == "auto":
+            return next(renderer for renderer in renderers if renderer.available())
+        for renderer in renderers:
+            if renderer.name == self.renderer:
+                return renderer
+        raise ValueError(f"unknown renderer: {self.renderer}")
 
     #функция генерации изображения
-    def visualize(self, output_path="graph.png"):
-        mermaid_content = self.generate_mermaid_diagram()
-        print(mermaid_content)
-        #записываем во временный файл содержимое диаграммы
-        temp_file = "temp.mmd"
-        with open(temp_file, "w") as f:
-            f.write(mermaid_content)
-
-        #вызов инструмента mmdc для генерации изображения
+    #результат кэшируется по хэшу исходника диаграммы: неизменный граф не перерисовывается
+    def visualize(self, output_path=None, collapse_cycles=False, reduce=False, open_result=None):
+        renderer = self.make_renderer()
+        output_path = output_path or "graph" + renderer.extension
+        #записываем во временный файл с уникальным именем содержимое диаграммы
+        with tempfile.NamedTemporaryFile("w", suffix="." + renderer.source_format, delete=False, encoding="utf-8") as f:
+            temp_file = f.name
+            self.write_diagram(f, renderer.source_format, collapse_cycles, reduce)
+
         try:
-            subprocess.run(
-                [self.visualizer_path, "-i", temp_file, "-o", output_path],
-                check=True
-            )
-            print(f"graph generated at {output_path}")
-            os.startfile(output_path)
+            if not self.cache_dir: #без своего каталога кэша не кэшируем: общий временный каталог доступен всем
+                renderer.render(temp_file, output_path)
+            else:
+                extension = os.path.splitext(output_path)[1]
+                render_dir = os.path.join(self.cache_dir, "renders")
+                os.makedirs(render_dir, exist_ok=True)
+                key_source = f"{renderer.name}|{extension}|{self.file_hash(temp_file)}"
+                key = hashlib.sha256(key_source.encode("utf-8")).hexdigest()[:16]
+                cached_path = os.path.join(render_dir, key + extension)
+                if not os.path.exists(cached_path):
+                    temp_output = os.path.join(render_dir, f"{key}.{os.getpid()}.tmp{extension}")
+                    renderer.render(temp_file, temp_output)
+                    os.replace(temp_output, cached_path)
+                shutil.copyfile(cached_path, output_path)
         finally:
             os.remove(temp_file)  #удаление временного файла
+        print(f"graph generated at {output_path}")
+        if self.open_result if open_result is None else open_result:
+            open_file(output_path)
+        return output_path
 
 
-if __name__ == "__main__":
-    config_path = "config/config.yaml"
-    visualizer = DependencyVisualizer(config_path)
+#граф в процессах пакетного режима, при fork достается без передачи
+_graph = None
+
+def _init_graph(graph):
+    global _graph
+    _graph = graph
+
+#замыкания для части корней в отдельном процессе, промежуточные результаты общие внутри части
+#в графе есть все пакеты индекса, поэтому пакет без связей получает пустое замыкание, а не ошибку
+def _closure_worker(roots, output_dir):
+    summaries = []
+    memo = {}
+    known = [root for root in roots if root in _graph.ids]
+    closures = _graph.closures(known, memo)
+    for root in roots:
+        if root not in closures:
+            summaries.append({"package": root, "error": "package not found"})
+            continue
+        nodes = closures[root]
+        names = [_graph.names[node] for node in nodes]
+        summary = {"package": root, "closure_size": len(nodes) - 1,
+                   "dependencies": sorted(name for name in names if name != root)}
+        if output_dir: #граф замыкания отдельным файлом
+            path = os.path.join(output_dir, f"{root}.mmd")
+            edges = ((_graph.names[node], _graph.names[target]) for node in nodes for target in _graph.successors(node))
+            with open(path, "w") as f:
+                DependencyVisualizer.write_mermaid(f, [], edges)
+            summary["graph"] = path
+        summaries.append(summary)
+    return summaries
+
+#пакетный режим: индекс загружается один раз, замыкания для списка пакетов считаются в нескольких процессах
+#без каталога для графов замыкания сохраняются в кэше и при следующих запусках не пересчитываются
+def batch_closures(visualizer, roots, workers=None, output_dir=None):
+    package_data = visualizer.load_data() #обновление кэша сбрасывает замыкания с изменившимися пакетами
+    stored = {} if output_dir else visualizer.load_closures()
+    missing = [root for root in roots if root not in stored]
+    computed = _compute_closures(DependencyGraph(package_data), missing, workers, output_dir) if missing else None
+    fresh = {}
+    for root in roots:
+        if root in stored:
+            yield stored[root]
+            continue
+        summary = next(computed)
+        if "error" not in summary:
+            fresh[root] = summary
+        yield summary
+    if fresh and not output_dir:
+        visualizer.save_closures(fresh)
+
+#замыкания по частям в отдельных процессах, результаты в порядке roots
+def _compute_closures(graph, roots, workers, output_dir):
+    graph.strongly_connected_components() #считаем до запуска процессов, чтобы не повторять в каждом
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    chunk_size = max(1, -(-len(roots) // workers))
+    chunks = [roots[i:i + chunk_size] for i in range(0, len(roots), chunk_size)]
+    if len(chunks) <= 1:
+        _init_graph(graph)
+        yield from _closure_worker(roots, output_dir)
+        return
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with ProcessPoolExecutor(len(chunks), mp_context=context, initializer=_init_graph, initargs=(graph,)) as executor:
+        for summaries in executor.map(_closure_worker, chunks, [output_dir] * len(chunks)):
+            yield from summaries
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Dependency graph visualizer")
+    arg_parser.add_argument("--config", default="config/config.yaml")
+    subparsers = arg_parser.add_subparsers(dest="command")
+    batch_parser = subparsers.add_parser("batch", help="замыкания для списка пакетов, по строке JSON на пакет")
+    batch_parser.add_argument("packages", nargs="*")
+    batch_parser.add_argument("--file", help="файл со списком пакетов, по одному на строку")
+    batch_parser.add_argument("--workers", type=int, default=None)
+    batch_parser.add_argument("--output-dir", help="каталог для графа каждого пакета в формате mermaid")
+    query_parser = subparsers.add_parser("query", help="метрики графа всего индекса в формате JSON")
+    query_parser.add_argument("query", choices=["reverse-counts", "fan-in", "fan-out", "longest-chain", "depth", "path"])
+    query_parser.add_argument("packages", nargs="*")
+    query_parser.add_argument("--top", type=int, default=20, help="сколько пакетов выводить в рейтинге")
+    arg_parser.add_argument("--collapse-cycles", action="store_true", help="рисовать каждый цикл одним узлом")
+    arg_parser.add_argument("--reduce", action="store_true", help="убрать ребра, которые следуют из других путей")
+    arg_parser.add_argument("--cycles", action="store_true", help="вывести найденные циклы")
+    arg_parser.add_argument("--format", choices=["mermaid", "dot", "json"],
+                            help="записать граф в этом формате вместо отрисовки")
+    arg_parser.add_argument("--output", default="-", help="файл для --format, по умолчанию stdout")
+    arg_parser.add_argument("--renderer", choices=["auto", "mmdc", "dot", "svg"], help="чем рисовать граф")
+    arg_parser.add_argument("--image", help="файл картинки, по умолчанию graph.png или graph.svg")
+    arg_parser.add_argument("--no-open", action="store_true", help="не открывать картинку после отрисовки")
+    args = arg_parser.parse_args()
+
+    visualizer = DependencyVisualizer(args.config)
+    if args.command == "batch":
+        roots = list(args.packages)
+        if args.file:
+            with open(args.file, "r") as f:
+                roots.extend(line.strip() for line in f if line.strip())
+        for summary in batch_closures(visualizer, roots or [visualizer.package], args.workers, args.output_dir):
+            print(json.dumps(summary))
+        return
+    if args.command == "query":
+        print(json.dumps(visualizer.analyze(args.query, args.packages, args.top)))
+        return
     visualizer.build_dependency_graph()
-    visualizer.visualize()
+    if args.cycles:
+        for cycle in visualizer.find_cycles():
+            print("cycle: " + ", ".join(cycle))
+    if args.format is None:
+        if args.renderer:
+            visualizer.renderer = args.renderer
+        visualizer.visualize(args.image, args.collapse_cycles, args.reduce, False if args.no_open else None)
+    elif args.output == "-":
+        visualizer.write_diagram(sys.stdout, args.format, args.collapse_cycles, args.reduce)
+    else:
+        with open(args.output, "w") as f:
+            visualizer.write_diagram(f, args.format, args.collapse_cycles, args.reduce)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,53 @@
+import os
+import io
+import json
+import gzip
+import difflib
+import hashlib
+import tempfile
 import unittest
 from unittest.mock import patch, mock_open
 import requests
-from homework2.src.Visualizer import DependencyVisualizer
+from homework2.src.Visualizer import DependencyVisualizer, PackageIndex, DependencyGraph, batch_closures, apply_ed_diff
+from homework2.src.Visualizer import SvgRenderer, open_file
+
+#небольшой индекс пакетов для тестов без сети
+PACKAGES = """Package: openssl
+Version: 1.1.1f-1ubuntu2
+Depends: libc6 (>= 2.15), libssl1.1 (>= 1.1.1)
+
+Package: libssl1.1
+Depends: libc6 (>= 2.25), debconf (>= 0.5) | debconf-2.0
+
+Package: libc6
+Depends: libgcc-s1, libcrypt1 (>= 1:4.4.10-10ubuntu4)
+
+Package: libgcc-s1
+Depends: gcc-10-base (= 10-20200411-0ubuntu1), libc6 (>= 2.14)
+
+Package: libcrypt1
+Depends: libc6 (>= 2.25)
+
+Package: gcc-10-base
+
+Package: debconf
+"""
+
+#ed-скрипт в формате diff --ed: команды снизу вверх
+def ed_diff(old, new):
+    script = []
+    for tag, i1, i2, j1, j2 in reversed(difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes()):
+        if tag == "equal":
+            continue
+        if tag == "insert":
+            script.append(f"{i1}a\n")
+        else:
+            address = f"{i1 + 1},{i2}" if i2 - i1 > 1 else f"{i1 + 1}"
+            script.append(address + ("d\n" if tag == "delete" else "c\n"))
+        if tag != "delete":
+            script.extend(new[j1:j2])
+            script.append(".\n")
+    return "".join(script)
 
 
 class TestVisualizer(unittest.TestCase):
@@ -78,3 +124,365 @@ class TestVisualizer(unittest.TestCase):
 
         diagram = visualizer.generate_mermaid_diagram()
         assert diagram.strip() == expected_diagram
+
+
+class TestLocalIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.packages_path = os.path.join(self.temp_dir.name, "Packages.gz")
+        self.write_packages(PACKAGES)
+        self.cache_dir = os.path.join(self.temp_dir.name, "cache")
+        self.expected_dependencies = {
+            'openssl': ['libc6', 'libssl1.1'],
+            'libc6': ['libgcc-s1', 'libcrypt1'],
+            'libssl1.1': ['libc6', 'debconf'],
+            'libgcc-s1': ['gcc-10-base', 'libc6'],
+            'libcrypt1': ['libc6']
+        }
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_packages(self, text):
+        with gzip.open(self.packages_path, "wt", encoding="utf-8") as f:
+            f.write(text)
+
+    #визуализатор с конфигурацией во временном каталоге
+    def make_visualizer(self, **options):
+        config = {"package": "openssl", "repo_url": self.packages_path, "visualizer_path": "mmdc"}
+        config.update(options)
+        config_path = os.path.join(self.temp_dir.name, "config.yaml")
+        with open(config_path, "w") as f:
+            for key, value in config.items():
+                f.write(f"{key}: {value!r}\n")
+        return DependencyVisualizer(config_path)
+
+    def test_local_source(self):
+        visualizer = self.make_visualizer()
+        visualizer.build_dependency_graph()
+        self.assertEqual(visualizer.dependencies, self.expected_dependencies)
+
+        #url вида file://
+        visualizer = self.make_visualizer(repo_url="file://" + self.packages_path)
+        self.assertEqual(visualizer.load_data()["libcrypt1"], ["libc6"])
+
+    def test_cache(self):
+        visualizer = self.make_visualizer(cache_dir=self.cache_dir)
+        parsed = visualizer.load_data()
+        self.assertEqual(parsed["openssl"], ["libc6", "libssl1.1"])
+
+        #повторная загрузка берет скомпилированный индекс без разбора
+        with patch.object(DependencyVisualizer, "parse_stanzas") as parse:
+            cached = visualizer.load_data()
+            parse.assert_not_called()
+        self.assertIsInstance(cached, PackageIndex)
+        self.assertEqual(dict(cached), parsed)
+        #пакеты без зависимостей тоже есть в индексе
+        self.assertEqual(cached["gcc-10-base"], [])
+        self.assertNotIn("missing", cached)
+        cached.close()
+
+        #изменение файла сбрасывает кэш
+        self.write_packages(PACKAGES.replace("Depends: libc6 (>= 2.25)\n\nPackage: gcc", "Depends: zlib1g\n\nPackage: gcc"))
+        self.assertEqual(visualizer.load_data()["libcrypt1"], ["zlib1g"])
+
+
+    def test_relations(self):
+        self.write_packages("""Package: app
+Version: 2.0
+Pre-Depends: dpkg (>= 1.15)
+Depends: mail-transport-agent, libfoo (>= 1.0) | libbar,
+ libbaz:any (<< 3) [amd64], libfoo
+Recommends: docs
+Description: test package
+ with a long description
+
+Package: postfix
+Provides: mail-transport-agent, smtp-server (= 1.0)
+
+Package: libbar
+
+Package: libbaz
+""")
+        visualizer = self.make_visualizer()
+        with open(self.packages_path, "rb") as raw, gzip.open(raw, "rt", encoding="utf-8") as f:
+            records = list(visualizer.parse_stanzas(f))
+        app = records[0]
+
+        #группы альтернатив с версиями, продолжение поля на следующей строке
+        self.assertEqual(app.relations["Depends"], (
+            (("mail-transport-agent", None, None),),
+            (("libfoo", ">=", "1.0"), ("libbar", None, None)),
+            (("libbaz", "<<", "3"),),
+            (("libfoo", None, None),),
+        ))
+        self.assertEqual(app.relations["Pre-Depends"], ((("dpkg", ">=", "1.15"),),))
+        self.assertEqual(records[1].provides, (("mail-transport-agent", None, None), ("smtp-server", "=", "1.0")))
+
+        #виртуальный пакет заменяется пакетом, который его предоставляет,
+        #из альтернатив выбирается существующий пакет
+        self.assertEqual(visualizer.load_data(), {"app": ["postfix", "libbar", "libbaz", "libfoo"],
+                                                  "postfix": [], "libbar": [], "libbaz": []})
+
+        #Pre-Depends и Recommends учитываются, если указаны в настройках
+        visualizer = self.make_visualizer(dependency_fields=["Pre-Depends", "Depends", "Recommends"])
+        self.assertEqual(visualizer.load_data()["app"], ["dpkg", "postfix", "libbar", "libbaz", "libfoo", "docs"])
+
+    def test_graph_engine(self):
+        graph = DependencyGraph(self.expected_dependencies)
+        self.assertEqual(len(graph), 7)
+        self.assertEqual(graph.edge_count(), 9)
+
+        #обход в ширину совпадает с порядком build_dependency_graph
+        self.assertEqual(graph.closure_names("openssl"),
+                         ["openssl", "libc6", "libssl1.1", "libgcc-s1", "libcrypt1", "debconf", "gcc-10-base"])
+        self.assertEqual(graph.closure_names("openssl", order="dfs"),
+                         ["openssl", "libssl1.1", "debconf", "libc6", "libcrypt1", "libgcc-s1", "gcc-10-base"])
+        self.assertEqual(graph.closure_names("openssl", max_depth=1), ["openssl", "libc6", "libssl1.1"])
+
+        #обратные зависимости
+        self.assertEqual(sorted(graph.reverse_dependencies("libcrypt1")),
+                         ["libc6", "libgcc-s1", "libssl1.1", "openssl"])
+        self.assertEqual(graph.reverse_dependencies("openssl"), [])
+
+    def test_depth_limit(self):
+        visualizer = self.make_visualizer()
+        visualizer.build_dependency_graph(max_depth=1)
+        self.assertEqual(visualizer.dependencies, {"openssl": ["libc6", "libssl1.1"]})
+
+    def test_components(self):
+        graph = DependencyGraph(self.expected_dependencies)
+        component = graph.strongly_connected_components()
+        cycle = {component[graph.ids[name]] for name in ("libc6", "libgcc-s1", "libcrypt1")}
+        self.assertEqual(len(cycle), 1)
+        self.assertEqual(graph.component_count, 5)
+
+        #зависимости компоненты имеют меньшие номера
+        for source, deps in self.expected_dependencies.items():
+            for dep in deps:
+                self.assertLessEqual(component[graph.ids[dep]], component[graph.ids[source]])
+
+        #замыкания через компоненты совпадают с обходом
+        closures = graph.closures(list(self.expected_dependencies))
+        for root, nodes in closures.items():
+            self.assertEqual(sorted(nodes), sorted(graph.closure(root)))
+
+    def test_batch(self):
+        self.write_packages(PACKAGES + "\nPackage: lonely\n")
+        visualizer = self.make_visualizer()
+        output_dir = os.path.join(self.temp_dir.name, "graphs")
+        summaries = list(batch_closures(visualizer, ["openssl", "libc6", "missing", "lonely"], workers=2,
+                                        output_dir=output_dir))
+
+        self.assertEqual([summary["package"] for summary in summaries], ["openssl", "libc6", "missing", "lonely"])
+        self.assertEqual(summaries[0]["closure_size"], 6)
+        self.assertEqual(summaries[1]["dependencies"], ["gcc-10-base", "libcrypt1", "libgcc-s1"])
+        self.assertEqual(summaries[2]["error"], "package not found")
+        #пакет без связей есть в индексе, его замыкание пустое
+        self.assertEqual((summaries[3]["closure_size"], summaries[3]["dependencies"]), (0, []))
+        with open(summaries[1]["graph"]) as f:
+            self.assertIn("    libc6 --> libgcc-s1\n", f.read())
+        with open(summaries[3]["graph"]) as f:
+            self.assertEqual(f.read(), "graph TD\n")
+
+    def test_cycles(self):
+        visualizer = self.make_visualizer()
+        visualizer.build_dependency_graph()
+        self.assertEqual([sorted(cycle) for cycle in visualizer.find_cycles()], [["libc6", "libcrypt1", "libgcc-s1"]])
+
+        #цикл рисуется одним узлом
+        diagram = visualizer.generate_mermaid_diagram(collapse_cycles=True)
+        self.assertEqual(diagram.split("\n")[1], '    SCC0["libc6, libgcc-s1, libcrypt1"]')
+        self.assertEqual(diagram.split("\n")[2:], [
+            "    openssl --> SCC0",
+            "    openssl --> libssl1.1",
+            "    libssl1.1 --> SCC0",
+            "    libssl1.1 --> debconf",
+            "    SCC0 --> gcc-10-base",
+        ])
+
+        #openssl --> SCC0 следует из openssl --> libssl1.1 --> SCC0
+        diagram = visualizer.generate_mermaid_diagram(collapse_cycles=True, reduce=True)
+        self.assertNotIn("    openssl --> SCC0", diagram)
+        self.assertIn("    openssl --> libssl1.1", diagram)
+
+        #без сворачивания сокращаются только ребра между разными компонентами
+        diagram = visualizer.generate_mermaid_diagram(reduce=True)
+        self.assertNotIn("    openssl --> libc6", diagram)
+        self.assertIn("    libc6 --> libcrypt1", diagram)
+
+    def test_writers(self):
+        visualizer = self.make_visualizer()
+        visualizer.build_dependency_graph()
+
+        out = io.StringIO()
+        visualizer.write_diagram(out, "dot")
+        dot = out.getvalue()
+        self.assertTrue(dot.startswith("digraph dependencies {\n"))
+        self.assertIn('    "libssl1.1" -> "debconf";\n', dot)
+
+        out = io.StringIO()
+        visualizer.write_diagram(out, "json")
+        data = json.loads(out.getvalue())
+        self.assertEqual(len(data["edges"]), 9)
+        self.assertEqual(data["edges"][0], ["openssl", "libc6"])
+
+    def test_size_guard(self):
+        #граф больше предела сворачивается: цикл одним узлом, лишние ребра убраны
+        visualizer = self.make_visualizer(max_nodes=5)
+        visualizer.build_dependency_graph()
+        nodes, edges = visualizer.diagram_for_output()
+        self.assertEqual(nodes, [("SCC0", "libc6, libgcc-s1, libcrypt1")])
+        self.assertEqual(len({node for edge in edges for node in edge}), 5)
+
+        #если и этого мало - граф обрезается по глубине
+        #узлы "+N more" тоже считаются в пределе
+        visualizer.max_nodes = 3
+        nodes, edges = visualizer.diagram_for_output()
+        self.assertEqual(edges, [("openssl", "MORE0")])
+        self.assertEqual(nodes, [("MORE0", "+2 more")])
+        self.assertLessEqual(len({node for edge in edges for node in edge}), 3)
+        visualizer.max_nodes = 5
+        nodes, edges = visualizer.summary_diagram()
+        self.assertEqual(edges, [("openssl", "libc6"), ("openssl", "libssl1.1"),
+                                 ("libc6", "MORE0"), ("libssl1.1", "libc6"), ("libssl1.1", "MORE1")])
+        self.assertEqual(nodes, [("MORE0", "+2 more"), ("MORE1", "+1 more")])
+        self.assertEqual(len({node for edge in edges for node in edge}), 5)
+
+    def test_multiple_sources(self):
+        security_path = os.path.join(self.temp_dir.name, "Packages-security")
+        with open(security_path, "w", encoding="utf-8") as f:
+            f.write("Package: openssl\nDepends: zlib1g\n\n"
+                    "Package: curl\nDepends: openssl, mail-transport-agent\n\n"
+                    "Package: postfix\nProvides: mail-transport-agent\n")
+        visualizer = self.make_visualizer(repo_url=[self.packages_path, security_path], cache_dir=self.cache_dir)
+        package_data = visualizer.load_data()
+        #пакет из первого источника не перекрывается, виртуальный пакет разрешается по всем источникам
+        self.assertEqual(package_data["openssl"], ["libc6", "libssl1.1"])
+        self.assertEqual(package_data["curl"], ["openssl", "postfix"])
+
+        cached = visualizer.load_data()
+        self.assertIsInstance(cached, PackageIndex)
+        self.assertEqual(dict(cached), package_data)
+        cached.close()
+
+        #изменение любого источника сбрасывает кэш
+        with open(security_path, "a", encoding="utf-8") as f:
+            f.write("\nPackage: wget\nDepends: libssl1.1\n")
+        self.assertEqual(visualizer.load_data()["wget"], ["libssl1.1"])
+
+    def test_ed_diff(self):
+        old = ["a\n", "b\n", "c\n", "d\n", "e\n"]
+        new = ["x\n", "a\n", "c\n", "y\n", "z\n", "e\n", "f\n"]
+        self.assertEqual(apply_ed_diff(old, ed_diff(old, new).splitlines(keepends=True)), new)
+        with self.assertRaises(ValueError):
+            apply_ed_diff(old, ["1,2w\n"])
+
+    def test_incremental(self):
+        visualizer = self.make_visualizer(cache_dir=self.cache_dir, incremental=True)
+        visualizer.load_data()
+        summaries = list(batch_closures(visualizer, ["openssl", "debconf"]))
+        self.assertEqual(set(visualizer.load_closures()), {"openssl", "debconf"})
+
+        #новая версия индекса: у libcrypt1 новая зависимость, появился пакет zlib1g
+        new_text = PACKAGES.replace("Depends: libc6 (>= 2.25)\n\nPackage: gcc",
+                                    "Depends: libc6 (>= 2.25), zlib1g\n\nPackage: gcc") + "\nPackage: zlib1g\n"
+        patch_text = ed_diff(PACKAGES.splitlines(keepends=True), new_text.splitlines(keepends=True)).encode("utf-8")
+        diff_dir = os.path.join(self.temp_dir.name, "Packages.diff")
+        os.makedirs(diff_dir)
+        with gzip.open(os.path.join(diff_dir, "T-1.gz"), "wb") as f:
+            f.write(patch_text)
+        sha256 = lambda data: hashlib.sha256(data).hexdigest()
+        with open(os.path.join(diff_dir, "Index"), "w") as f:
+            f.write(f"SHA256-Current: {sha256(new_text.encode())} {len(new_text)}\n"
+                    f"SHA256-History:\n {sha256(PACKAGES.encode())} {len(PACKAGES)} T-1\n"
+                    f"SHA256-Patches:\n {sha256(patch_text)} {len(patch_text)} T-1\n")
+        self.write_packages(new_text)
+
+        #индекс обновлен по диффу без загрузки всего файла
+        with patch.object(DependencyVisualizer, "open_source") as open_source:
+            package_data = visualizer.load_data()
+            open_source.assert_not_called()
+        self.assertEqual(package_data, self.make_visualizer().load_data())
+        self.assertEqual(package_data["libcrypt1"], ["libc6", "zlib1g"])
+
+        #замыкание с изменившимся пакетом сброшено, остальные сохранены
+        self.assertEqual(visualizer.load_closures(), {"debconf": summaries[1]})
+        summary = next(batch_closures(visualizer, ["openssl"]))
+        self.assertIn("zlib1g", summary["dependencies"])
+
+    def test_analytics(self):
+        graph = DependencyGraph(self.expected_dependencies)
+        counts = graph.reverse_dependency_counts()
+        for name, i in graph.ids.items():
+            self.assertEqual(counts[i], len(graph.reverse_dependencies(name)))
+        self.assertEqual(graph.ranking(graph.fan_in(), 1), [("libc6", 4)])
+        self.assertEqual(graph.fan_out()[graph.ids["openssl"]], 2)
+        self.assertEqual(graph.longest_chain(), ["openssl", "libssl1.1", "libc6", "gcc-10-base"])
+        self.assertEqual(graph.shortest_path("openssl", "gcc-10-base"), ["openssl", "libc6", "libgcc-s1", "gcc-10-base"])
+        self.assertIsNone(graph.shortest_path("debconf", "openssl"))
+        self.assertEqual(graph.depth_histogram("openssl"), [1, 2, 3, 1])
+
+        #запросы через визуализатор: граф строится один раз, результаты в формате для JSON
+        visualizer = self.make_visualizer()
+        self.assertEqual(visualizer.analyze("reverse-counts", top=1), [("gcc-10-base", 5)])
+        self.assertEqual(visualizer.analyze("fan-out", ["libc6"]), {"libc6": 2})
+        self.assertEqual(visualizer.analyze("path", ["openssl", "missing"]),
+                         {"error": "package not found", "packages": ["missing"]})
+        with patch.object(DependencyVisualizer, "load_graph") as load_graph:
+            self.assertEqual(visualizer.analyze("longest-chain", ["libssl1.1"])["length"], 3)
+            load_graph.assert_not_called()
+
+        #пакет без связей есть в графе, неизвестное имя проверяется по кэшу без повторного чтения источников
+        self.write_packages(PACKAGES + "\nPackage: lonely\n")
+        visualizer = self.make_visualizer(package="lonely", cache_dir=self.cache_dir)
+        self.assertEqual(visualizer.analyze("fan-in", ["lonely", "libc6"]), {"lonely": 0, "libc6": 4})
+        self.assertEqual(visualizer.analyze("depth"), {"package": "lonely", "levels": [1]})
+        self.assertEqual(visualizer.analyze("longest-chain", ["lonely"]), {"length": 1, "chain": ["lonely"]})
+        self.assertEqual(visualizer.analyze("path", ["lonely", "libc6"]), {"path": None})
+        with patch.object(DependencyVisualizer, "read_source") as read_source:
+            visualizer = self.make_visualizer(package="missing", cache_dir=self.cache_dir)
+            self.assertEqual(visualizer.analyze("depth"), {"error": "package not found", "packages": ["missing"]})
+            read_source.assert_not_called()
+
+        #обходы хранятся только для нескольких последних корней
+        for name in graph.names:
+            graph.depth_histogram(name)
+        self.assertEqual(len(graph.bfs_cache), min(len(graph.names), graph.bfs_cache_size))
+        graph = DependencyGraph(self.expected_dependencies)
+        graph.bfs_cache_size = 2
+        for name in graph.names:
+            graph.shortest_path(name, "libc6")
+        self.assertEqual(list(graph.bfs_cache), graph.names[-2:])
+
+    def test_render(self):
+        visualizer = self.make_visualizer(cache_dir=self.cache_dir, visualizer_path="missing-mmdc", open_result=False)
+        visualizer.build_dependency_graph()
+        output_path = os.path.join(self.temp_dir.name, "graph.svg")
+        with patch("shutil.which", return_value=None): #ни mmdc, ни dot нет - рисуется svg на python
+            self.assertIsInstance(visualizer.make_renderer(), SvgRenderer)
+            visualizer.visualize(output_path)
+        with open(output_path, encoding="utf-8") as f:
+            svg = f.read()
+        self.assertTrue(svg.startswith("<svg"))
+        self.assertEqual(svg.count("<rect"), 7)
+        self.assertEqual(svg.count("marker-end"), 9)
+
+        #неизменный граф берется из кэша без отрисовки
+        os.remove(output_path)
+        with patch.object(SvgRenderer, "render") as render, patch("shutil.which", return_value=None):
+            visualizer.visualize(output_path)
+            render.assert_not_called()
+        self.assertTrue(os.path.exists(output_path))
+
+        #без cache_dir картинка рисуется заново и в общий временный каталог не попадает
+        visualizer = self.make_visualizer(visualizer_path="missing-mmdc", open_result=False)
+        visualizer.build_dependency_graph()
+        with patch("shutil.which", return_value=None), patch("shutil.copyfile") as copyfile:
+            visualizer.visualize(output_path)
+            copyfile.assert_not_called()
+
+        with patch("sys.platform", "linux"), patch("shutil.which", return_value="/usr/bin/xdg-open"), \
+                patch("subprocess.Popen") as popen:
+            open_file(output_path)
+            self.assertEqual(popen.call_args[0][0], ["xdg-open", output_path])
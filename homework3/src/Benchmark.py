@@ -0,0 +1,204 @@
+import argparse
+import functools
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from ConfigParser import ConfigParser, Lexer
+
+#вложенное значение заданной глубины: словари и массивы по очереди
+def generate_value(rng, depth):
+    if depth == 0:
+        return str(rng.randrange(10000))
+    if depth % 2:
+        items = ", ".join(f"key{i} => {generate_value(rng, depth - 1)}" for i in range(2))
+        return f"table(\n    {items},\n)"
+    return "<< " + ", ".join(generate_value(rng, depth - 1) for _ in range(2)) + " >>"
+
+#конфигурация из definitions констант, каждая ссылается на первую
+def generate_config(definitions, depth, seed=0):
+    rng = random.Random(seed)
+    lines = ["(def const0 1)"]
+    for i in range(1, definitions):
+        lines.append(f"(def const{i} << #[const0], {generate_value(rng, depth)} >>)")
+    return "\n".join(lines) + "\n"
+
+#время разбора конфигураций растущего размера и глубины вложенности
+def bench_parse(sizes, depths, repeat):
+    for depth in depths:
+        for definitions in sizes:
+            text = generate_config(definitions, depth)
+            parse = dump = float("inf")
+            for _ in range(repeat):
+                parser = ConfigParser()
+                start = time.perf_counter()
+                parser.parse_config(text)
+                parse = min(parse, time.perf_counter() - start)
+                start = time.perf_counter()
+                parser.dump()
+                dump = min(dump, time.perf_counter() - start)
+            print(f"parse {definitions} definitions, depth {depth} ({len(text) / 1024:.0f} KiB): "
+                  f"{parse:.3f}s ({parse / len(text) * 2**20:.2f}s/MiB), yaml output {dump:.3f}s")
+
+#время и пиковая память одного прогона
+def measure(run):
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+#чтение файла целиком и один yaml.dump против потоковой обработки кусками
+def bench_stream(sizes, depth, chunk_size):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for definitions in sizes:
+            path = os.path.join(temp_dir, f"config{definitions}.conf")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(generate_config(definitions, depth))
+            size = os.path.getsize(path) / 2**20
+
+            #вывод пишется в файл, как в обычном запуске с перенаправлением
+            def whole():
+                with open(path, "r", encoding="utf-8") as f, open(os.devnull, "w") as output:
+                    output.write(ConfigParser().process_config(f.read()))
+
+            def stream():
+                with open(path, "r", encoding="utf-8") as f, open(os.devnull, "w") as output:
+                    ConfigParser().stream_config(iter(functools.partial(f.read, chunk_size), ""), output)
+
+            for name, run in (("whole file", whole), ("stream", stream)):
+                elapsed, peak = measure(run)
+                print(f"{name}, {definitions} definitions, depth {depth} ({size:.1f} MiB): "
+                      f"{elapsed:.3f}s, peak memory {peak:.1f} MiB")
+
+#лексемы с номером строки и столбца у каждой, как при подсчете позиций во время разбора
+class EagerLexer(Lexer):
+    def tokens(self):
+        line, line_start = 1, 0
+        for kind, text, offset in super().tokens():
+            lines = self.text.count("\n", line_start, offset)
+            if lines:
+                line += lines
+                line_start = self.text.rfind("\n", line_start, offset) + 1
+            yield kind, text, (offset, line, offset - line_start + 1)
+
+#разбор без ошибок, поиск ошибки в конце большого файла и сбор всех ошибок
+def bench_errors(sizes, depth, repeat):
+    for definitions in sizes:
+        text = generate_config(definitions, depth)
+        parts = text.split("\n(def ")
+        for i in range(5, len(parts), 10):  #ошибка в каждом десятом объявлении
+            parts[i] = parts[i].replace(", ", ", $", 1)
+        broken = "\n(def ".join(parts)
+        times = {"valid": float("inf"), "eager positions": float("inf"),
+                 "error at end": float("inf"), "collect all": float("inf")}
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ConfigParser().parse_config(text)
+            times["valid"] = min(times["valid"], time.perf_counter() - start)
+
+            parser = ConfigParser()
+            start = time.perf_counter()
+            parser.lexer = EagerLexer(text)
+            parser.tokens = parser.lexer.tokens()
+            parser.advance()
+            for _ in parser.read_definitions():
+                pass
+            times["eager positions"] = min(times["eager positions"], time.perf_counter() - start)
+
+            start = time.perf_counter()
+            try:
+                ConfigParser().parse_config(text + "(def last $)\n")
+            except ValueError as error:
+                message = str(error)
+            times["error at end"] = min(times["error at end"], time.perf_counter() - start)
+
+            parser = ConfigParser(collect_errors=True)
+            start = time.perf_counter()
+            parser.parse_config(broken)
+            times["collect all"] = min(times["collect all"], time.perf_counter() - start)
+        print(f"errors, {definitions} definitions, depth {depth} ({len(text) / 1024:.0f} KiB): "
+              + ", ".join(f"{name} {elapsed:.3f}s" for name, elapsed in times.items())
+              + f" ({len(parser.errors)} errors collected)")
+    print(message)
+
+#загрузка конфигурации из нескольких файлов без кэша, с пустым и с заполненным кэшем и после правки одного файла
+def bench_cache(sizes, depth, files):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for definitions in sizes:
+            parts = generate_config(definitions, depth).split("\n(def ")
+            step = -(-len(parts) // files)
+            paths = []
+            for i in range(0, len(parts), step):  #константы файлов ссылаются на const0 из первого файла
+                paths.append(os.path.join(temp_dir, f"config{definitions}_{i // step}.conf"))
+                with open(paths[-1], "w", encoding="utf-8") as f:
+                    f.write(("" if i == 0 else "(def ") + "\n(def ".join(parts[i:i + step]))
+            size = sum(os.path.getsize(path) for path in paths) / 2**20
+            cache_dir = os.path.join(temp_dir, f"cache{definitions}")
+            times = {}
+            for name in ("no cache", "cold", "warm", "last file changed"):
+                if name == "last file changed":
+                    with open(paths[-1], "a", encoding="utf-8") as f:
+                        f.write("(def extra 1)\n")
+                start = time.perf_counter()
+                ConfigParser(cache_dir=None if name == "no cache" else cache_dir).load_files(paths)
+                times[name] = time.perf_counter() - start
+            print(f"cache, {definitions} definitions in {len(paths)} files, depth {depth} ({size:.1f} MiB): "
+                  + ", ".join(f"{name} {elapsed:.3f}s" for name, elapsed in times.items()))
+
+#одна большая константа, на которую ссылаются все остальные: вывод с раскрытием и с якорями,
+#и ленивое вычисление одной константы против разбора всей конфигурации
+def bench_shared(sizes, depth):
+    rng = random.Random(0)
+    for definitions in sizes:
+        text = f"(def big {generate_value(rng, depth)})\n" + "".join(
+            f"(def use{i} << #[big], {i} >>)\n" for i in range(definitions))
+        parser = ConfigParser()
+        start = time.perf_counter()
+        parser.parse_config(text)
+        parse = time.perf_counter() - start
+        start = time.perf_counter()
+        report = parser.expansion_report()
+        report_time = time.perf_counter() - start
+        results = []
+        for aliases in (False, True):
+            start = time.perf_counter()
+            output = parser.dump(aliases=aliases)
+            results.append(f"{time.perf_counter() - start:.3f}s, {len(output) / 1024:.0f} KiB")
+        print(f"shared, {definitions} references, depth {depth} ({len(text) / 1024:.0f} KiB): parse {parse:.3f}s, "
+              f"report {report_time:.3f}s ({report['expanded_nodes']} nodes expanded, {report['unique_nodes']} distinct), "
+              f"yaml expanded {results[0]}, with aliases {results[1]}")
+
+        text = generate_config(definitions, depth)
+        start = time.perf_counter()
+        ConfigParser().parse_config(text)
+        eager = time.perf_counter() - start
+        start = time.perf_counter()
+        ConfigParser(lazy=True).parse_config(text)[f"const{definitions - 1}"]
+        lazy = time.perf_counter() - start
+        print(f"one constant of {definitions}: eager parse {eager:.3f}s, lazy {lazy:.3f}s")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="ConfigParser benchmarks")
+    arg_parser.add_argument("bench", nargs="?", default="parse", choices=["parse", "stream", "errors", "cache", "shared"])
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[100, 200, 400])
+    arg_parser.add_argument("--depths", type=int, nargs="+", default=[2, 6, 10])
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--chunk-size", type=int, default=65536)
+    arg_parser.add_argument("--files", type=int, default=10, help="на сколько файлов делить конфигурацию")
+    args = arg_parser.parse_args()
+    if args.bench == "parse":
+        bench_parse(args.sizes, args.depths, args.repeat)
+    elif args.bench == "stream":
+        bench_stream(args.sizes, args.depths[0], args.chunk_size)
+    elif args.bench == "errors":
+        bench_errors(args.sizes, args.depths[0], args.repeat)
+    elif args.bench == "cache":
+        bench_cache(args.sizes, args.depths[0], args.files)
+    else:
+        bench_shared(args.sizes, args.depths[0])
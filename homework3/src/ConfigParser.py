@@ -1,187 +1,585 @@
+import argparse
+import functools
+import hashlib
+import os
+import pickle
 import sys
-import regex as re
+import re
 import yaml
 
 class NoAliasDumper(yaml.SafeDumper):
     def ignore_aliases(self, data):
         return True
 
-class ConfigParser:
-    # регулярные выражения, необходимые для работы
-    PATTERN_TABLE = r'table\((?:[^()]*|(?R))*\)'
-    PATTERN_ARRAY = r'<<\s*(?:[^<>]|table\((?:[^()]*|(?R))*\)|(?R))*\s*>>'
-    PATTERN_DEF = r'\(def\s+([a-zA-Z][_a-zA-Z0-9]*)\s+((?:table\((?:[^()]*|(?R))*\)|<<\s*(?:[^<>]|(?R))*\s*>>|\d+|.*?))\s*\)'
-    PATTERN_CONST = r'#\[([a-zA-Z][_a-zA-Z0-9]*)\]'
+# вывод с якорями и ссылками yaml: общее значение пишется один раз, якорь называется по константе
+class AliasDumper(yaml.SafeDumper):
+    anchor_names = {}  # id значения -> имя константы
 
-    def __init__(self):
-        self.constants = {}  # массив с константами
+    def generate_anchor(self, node):
+        if not hasattr(self, "node_names"):
+            self.node_names = {id(self.represented_objects[value_id]): name for value_id, name in self.anchor_names.items()
+                               if value_id in self.represented_objects}
+        return self.node_names.get(id(node)) or super().generate_anchor(node)
 
-    # функция обработки словаря
-    def parse_table(self, text):
-        result = {}
-        key = None
-        value = ""
-        depth = 0
-        i = 0
-        text = text.replace("\n", "").replace(" ", "")
+# лексический анализатор: текст разбивается на лексемы за один проход одним регулярным выражением
+class Lexer:
+    PATTERN_TOKEN = re.compile(r"""
+        (?P<space>\s+)
+        |(?P<number>\d+)
+        |(?P<const>\#\[[a-zA-Z][_a-zA-Z0-9]*\])
+        |(?P<name>[a-zA-Z][_a-zA-Z0-9]*)
+        |(?P<arrow>=>)
+        |(?P<open_array><<)
+        |(?P<close_array>>>)
+        |(?P<open>\()
+        |(?P<close>\))
+        |(?P<comma>,)
+        |(?P<error>.)
+    """, re.VERBOSE)
 
-        while i < len(text):  # проходим по элементам строки
-            char = text[i]
+    # скобки: по ним находится конец значения без разбора остальных лексем
+    PATTERN_SCAN = re.compile(r"[()]")
+    SNIPPET_LIMIT = 1000  # сколько символов начала строки из прошлых кусков хранится для текста ошибки
 
-            if char == 't' and text[i:i + 6] == 'table(':  # если встретился вложенный словарь
-                depth += 1
-                value += 'table('
-                i += 5
-            elif char == '<' and text[i:i + 2] == '<<':  # если встретился вложенный массив
+    def __init__(self, text=""):
+        self.text = text  # текст или текущий кусок текста
+        self.offset = 0  # смещение self.text в исходном тексте
+        self.line = 1  # номер строки, с которой начинается self.text
+        self.column = 1  # номер столбца, с которого начинается self.text
+        self.counted = 0  # смещение, до которого посчитаны строки для прошлой ошибки
+        self.counted_line = 1  # номер строки по этому смещению
+        self.line_prefix = ""  # начало строки, с которой начинается self.text, из прошлых кусков
+        self.rest = ""  # уже прочитанный текст после self.text до конца куска
+
+    # лексемы (вид, текст, смещение в исходном тексте), последней идет лексема end;
+    # start и end ограничивают разбор частью текста
+    def tokens(self, start=0, end=None):
+        if end is None:
+            end = len(self.text)
+        offset = self.offset
+        for match in self.PATTERN_TOKEN.finditer(self.text, start, end):
+            kind = match.lastgroup
+            if kind != "space":
+                yield kind, match.group(), offset + match.start()
+        yield "end", "", offset + end
+
+    # лексемы текста, который читается кусками: лексемы не содержат пробельных символов,
+    # поэтому текст до последнего пробельного символа куска разбирается сразу,
+    # а хвост ждет следующего куска, так что в памяти держится один кусок
+    def stream_tokens(self, chunks):
+        for chunk in chunks:
+            cut = max(chunk.rfind(" "), chunk.rfind("\n"), chunk.rfind("\t"), chunk.rfind("\r"))
+            if cut < 0:  # лексема может продолжиться в следующем куске
+                self.text += chunk
+                continue
+            self.text, self.rest = self.text + chunk[:cut + 1], chunk[cut + 1:]
+            for token in self.tokens():
+                if token[0] != "end":
+                    yield token
+            # для номеров строк при ошибках считаем только переводы строк разобранного куска
+            lines = self.text.count("\n")
+            if lines:
+                self.line += lines
+                self.column = len(self.text) - self.text.rfind("\n")
+                self.line_prefix = self.text[self.text.rfind("\n") + 1:][-self.SNIPPET_LIMIT:]
+            else:
+                self.column += len(self.text)
+                self.line_prefix = (self.line_prefix + self.text)[-self.SNIPPET_LIMIT:]
+            self.offset += len(self.text)
+            self.text, self.rest = self.rest, ""
+        yield from self.tokens()
+
+    # конец значения, начинающегося со смещения start, - смещение первой незакрытой ")";
+    # None, если текст кончился раньше
+    def skip_value(self, start):
+        depth = 0
+        for match in self.PATTERN_SCAN.finditer(self.text, start - self.offset):
+            if match.group() == "(":
                 depth += 1
-                value += '<<'
-                i += 1
-            elif char == ')' and depth > 0:  # если закончился вложенный словарь
-                depth -= 1
-                value += ')'
-            elif char == '>' and text[i:i + 2] == '>>' and depth > 0:  # если закончился внутренний массив
+            elif depth:
                 depth -= 1
-                value += '>>'
-                i += 1
-            elif char == ',' and depth == 0:  # если закончилось текущее значение
-                if key is not None:
-                    result[key.strip()] = self.parse_value(value.strip())
-                    key = None
-                    value = ""
-            elif char == '=' and text[i:i + 2] == '=>' and depth == 0: # если был введен ключ и переход к значению
-                key = value.strip()
-                value = ""
-                i += 1
             else:
-                value += char
+                return self.offset + match.start()
+        return None
+
+    # строка, столбец и текст строки для смещения в текущем куске;
+    # считается только при ошибке, поэтому разбор без ошибок ничего не платит за позиции,
+    # а при сборе всех ошибок строки считаются от прошлой ошибки, и текст проходится один раз
+    def position(self, offset):
+        index = offset - self.offset
+        if not self.offset <= self.counted <= offset:
+            self.counted, self.counted_line = self.offset, self.line
+        self.counted_line += self.text.count("\n", self.counted - self.offset, index)
+        self.counted = offset
+        line = self.counted_line
+        line_start = self.text.rfind("\n", 0, index) + 1
+        line_end = self.text.find("\n", index)
+        if line_end < 0:  # строка продолжается в прочитанном хвосте куска
+            snippet = self.text[line_start:] + self.rest.split("\n", 1)[0]
+        else:
+            snippet = self.text[line_start:line_end]
+        column = index - line_start + (self.column if line_start == 0 else 1)
+        caret = index - line_start
+        if line_start == 0:  # начало строки было в прошлых кусках
+            snippet = self.line_prefix + snippet
+            caret += len(self.line_prefix)
+        return line, column, snippet.rstrip("\r"), caret
+
+# константы одного файла: чтение констант из предыдущих файлов запоминается как зависимость
+class FileConstants(dict):
+    def __init__(self, outer):
+        super().__init__()
+        self.outer = outer  # константы предыдущих файлов
+        self.references = set()  # имена констант предыдущих файлов, на которые ссылается файл
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name) or name in self.outer
+
+    def __getitem__(self, name):
+        if dict.__contains__(self, name):
+            return dict.__getitem__(self, name)
+        self.references.add(name)
+        return self.outer[name]
+
+# константы ленивого режима: объявление хранится как место в тексте и вычисляется при первом обращении,
+# поэтому можно ссылаться на константы, объявленные ниже, а циклические ссылки находятся при вычислении
+class LazyConstants(dict):
+    def __init__(self):
+        super().__init__()
+        self.definitions = {}  # имя -> (лексический анализатор, начало и конец значения в тексте)
+        self.evaluating = []  # вычисляемые сейчас константы
+        self.parsers = []  # их разборщики, у последнего текущая лексема - ссылка на следующую константу
+        self.failed = {}  # константы с ошибками -> ошибка
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name) or name in self.definitions
+
+    def __missing__(self, name):
+        if name not in self.definitions:
+            raise KeyError(name)
+        if name in self.evaluating:
+            cycle = self.evaluating[self.evaluating.index(name):] + [name]
+            raise self.parsers[-1].error(ValueError, "Constant cycle: " + " -> ".join(cycle))
+        if name in self.failed:
+            if not self.parsers:  # обращение не из другой константы: повторяем исходную ошибку
+                raise self.failed[name]
+            raise self.parsers[-1].error(ValueError, f"Invalid constant: {name}")
+        lexer, start, end = self.definitions[name]
+        parser = ConfigParser()
+        parser.constants = self
+        parser.lexer = lexer
+        parser.tokens = lexer.tokens(start, end)
+        parser.advance()
+        self.evaluating.append(name)
+        self.parsers.append(parser)
+        try:
+            value = parser.read_value()
+            if parser.token[0] != "end":  # значение заканчивается перед скобкой, закрывающей объявление
+                raise parser.error(SyntaxError, f"Invalid syntax: expected close, got {parser.token[1]}")
+        except (SyntaxError, ValueError) as error:
+            self.failed[name] = error
+            raise
+        finally:
+            self.evaluating.pop()
+            self.parsers.pop()
+        self[name] = value
+        return value
+
+class ConfigParser:
+    CACHE_VERSION = 1  # увеличивать при изменении языка или формата кэша
+
+    def __init__(self, collect_errors=False, cache_dir=None, lazy=False):
+        self.constants = LazyConstants() if lazy else {}  # массив с константами
+        self.lazy = lazy  # константы вычисляются при первом обращении
+        self.lexer = None  # лексический анализатор, нужен для позиций ошибок
+        self.tokens = None  # поток лексем
+        self.token = None  # текущая лексема
+        self.collect_errors = collect_errors  # собирать все ошибки вместо остановки на первой
+        self.errors = []  # собранные ошибки
+        self.cache_dir = cache_dir  # каталог кэша разобранных файлов, None - без кэша
+        self.redefine = True  # можно ли объявить константу повторно, при потоковом выводе нельзя
+
+    # переход к следующей лексеме
+    def advance(self):
+        self.token = next(self.tokens)
+
+    # ошибка с позицией текущей лексемы: строка, столбец и строка текста с указателем
+    def error(self, kind, message):
+        line, column, snippet, index = self.lexer.position(self.token[2])
+        error = kind(f"{message} at line {line}, column {column}\n    {snippet}\n    {' ' * index}^")
+        error.line, error.column = line, column
+        return error
+
+    # проверка вида текущей лексемы
+    def check(self, kind, text=None):
+        if self.token[0] != kind or (text is not None and self.token[1] != text):
+            raise self.error(SyntaxError, f"Invalid syntax: expected {text or kind}, got {self.token[1] or 'end of input'}")
+
+    # проверка вида текущей лексемы и переход к следующей
+    def expect(self, kind, text=None):
+        self.check(kind, text)
+        self.advance()
+
+    # начало разбора текста
+    def start(self, text):
+        self.lexer = Lexer(text)
+        self.tokens = self.lexer.tokens()
+        self.advance()
+
+    # после ошибки пропускаем лексемы до следующего "(def", возвращает True, если скобка уже пропущена
+    def synchronize(self):
+        while self.token[0] != "end":
+            previous = self.token[0]
+            self.advance()
+            if previous == "open" and self.token[:2] == ("name", "def"):
+                return True
+        return False
 
-            i += 1
+    # объявления друг за другом, возвращает имя каждой константы сразу после ее объявления;
+    # в режиме collect_errors ошибочное объявление пропускается, а ошибка запоминается
+    def read_definitions(self):
+        opened = False
+        while self.token[0] != "end":
+            try:
+                name = self.read_definition(opened)
+            except (SyntaxError, ValueError) as error:
+                if not self.collect_errors:
+                    raise
+                self.errors.append(error)
+                opened = self.synchronize()
+                continue
+            opened = False
+            yield name
+            self.advance()
 
-        if key is not None:  # считаем последний элемент
-            result[key.strip()] = self.parse_value(value.strip())
+    # объявление константы: (def имя значение), возвращает имя;
+    # закрывающая скобка остается текущей лексемой, чтобы при потоковом чтении не ждать следующую
+    def read_definition(self, opened=False):
+        if not opened:
+            self.expect("open")
+        self.expect("name", "def")
+        name = self.token[1]
+        self.check("name")
+        # проверяем сразу, пока кусок с именем текущий, иначе позиция ошибки будет в другом куске
+        if not self.redefine and name in self.constants:
+            raise self.error(ValueError, f"Constant redefined: {name}")
+        self.advance()
+        value = self.read_value()
+        self.check("close")
+        self.constants[name] = value
+        return name
 
+    # значение: число, словарь, массив или константа
+    def read_value(self):
+        kind, text, _ = self.token
+        if kind == "number":  # если встретили число
+            self.advance()
+            return int(text)
+        if kind == "open_array":  # если встретили массив
+            return self.read_array()
+        if kind == "name" and text == "table":  # если встретили словарь
+            return self.read_table()
+        if kind == "const":  # если встретили константу
+            const_name = text[2:-1]
+            if const_name not in self.constants:
+                raise self.error(ValueError, f"Undefined constant: {const_name}")
+            value = self.constants[const_name]  # в ленивом режиме ошибка вычисления указывает на эту ссылку
+            self.advance()
+            return value
+        raise self.error(ValueError, f"Invalid value: {text or 'end of input'}")
+
+    # словарь: table( имя => значение, ... ), запятая после последнего элемента необязательна
+    def read_table(self):
+        result = {}
+        self.advance()
+        self.expect("open")
+        while self.token[0] != "close":
+            key = self.token[1]
+            self.expect("name")
+            self.expect("arrow")
+            result[key] = self.read_value()
+            if self.token[0] != "comma":  # после значения без запятой словарь должен закончиться
+                break
+            self.advance()
+        self.expect("close")
         return result
 
-    # функция обработки массива
-    def parse_array(self, text):
+    # массив: << значение, ... >>, запятая после последнего элемента необязательна
+    def read_array(self):
         values = []
-        depth = 0
-        current_value = ""
-        i = 0
+        self.advance()
+        while self.token[0] != "close_array":
+            values.append(self.read_value())
+            if self.token[0] != "comma":  # после значения без запятой массив должен закончиться
+                break
+            self.advance()
+        self.expect("close_array")
+        return values
 
-        while i < len(text):  # проходим по всем элементам
-            char = text[i]
+    # функция обработки значения (число, словарь, массив) из текста
+    def parse_value(self, value):
+        self.start(value)
+        result = self.read_value()
+        self.expect("end")
+        return result
 
-            if char == '<' and text[i:i + 2] == '<<':  # если встретили вложенный массив
-                depth += 1
-                current_value += '<<'
-                i += 1
-            elif char == '>' and text[i:i + 2] == '>>' and depth > 0:  # если закончился вложенный массив
-                depth -= 1
-                current_value += '>>'
-                i += 1
-            elif char == 't' and text[i:i + 6] == "table(":  # если встретили вложенный словарь
-                depth += 1
-                current_value += 'table('
-                i += 5
-            elif char == ')' and depth > 0:  # если закончился вложенный словарь
-                depth -= 1
-                current_value += ')'
-            elif char == ',' and depth == 0:  # если закончилось текущее значение
-                values.append(current_value.strip())
-                current_value = ""
-            else:  # иначе сохраняем значение
-                current_value += char
+    # функция обработки словаря по тексту между скобками
+    def parse_table(self, text):
+        return self.parse_value(f"table({text})")
 
-            i += 1
+    # функция обработки массива по тексту между << и >>
+    def parse_array(self, text):
+        return self.parse_value(f"<<{text}>>")
 
-        if current_value.strip():  # если осталось значение
-            values.append(current_value.strip())
+    # разбор текста: объявления констант друг за другом
+    def parse_config(self, text):
+        if self.lazy:
+            return self.parse_lazy(text)
+        self.start(text)
+        for _ in self.read_definitions():
+            pass
+        return self.constants
 
-        return [self.parse_value(value) for value in values]
+    # ленивый разбор: у объявления запоминается место значения в тексте,
+    # значение разбирается при первом обращении; при повторном объявлении действует последнее
+    def parse_lazy(self, text):
+        self.start(text)
+        dict.clear(self.constants)  # новые объявления могут поменять уже вычисленные значения
+        self.constants.failed.clear()
+        opened = False
+        while self.token[0] != "end":
+            try:
+                self.read_lazy_definition(opened)
+            except (SyntaxError, ValueError) as error:
+                if not self.collect_errors:
+                    raise
+                self.errors.append(error)
+                opened = self.synchronize()
+                continue
+            opened = False
+        return self.constants
 
-    # функция обработки значения (число, словарь, массив)
-    def parse_value(self, value):
-        if re.match(self.PATTERN_TABLE, value):  # если встретили словарь
-            return self.parse_table(value[6:-1])
-        elif re.match(self.PATTERN_ARRAY, value):  # если встретили массив
-            return self.parse_array(value[2:-2])
-        elif re.match(r'\d+', value):  # если встретили число
-            return int(value)
-        elif re.match(self.PATTERN_CONST, value):  # если встретили константу
-            const_name = re.match(self.PATTERN_CONST, value).group(1)
-            if const_name in self.constants:
-                return self.constants[const_name]
-            else:
-                raise ValueError(f"Undefined constant: {const_name}")
-        else:
-            raise ValueError(f"Invalid value: {value}")
+    # разметка одного объявления ленивого режима без разбора значения
+    def read_lazy_definition(self, opened=False):
+        if not opened:
+            self.expect("open")
+        self.expect("name", "def")
+        name = self.token[1]
+        self.expect("name")
+        start = self.token[2]
+        end = self.lexer.skip_value(start)
+        if end is None:
+            self.token = ("end", "", len(self.lexer.text))
+            self.check("close")
+        self.constants.definitions[name] = (self.lexer, start, end)
+        self.tokens = self.lexer.tokens(end + 1)  # продолжаем после скобки, закрывающей объявление
+        self.advance()
 
-    # обработка входных данных
-    def process_config(self, text):
+    # вычисление всех констант ленивого режима, в режиме collect_errors константы с ошибками пропускаются
+    def resolve(self):
+        if not self.lazy:
+            return self.constants
+        for name in self.constants.definitions:
+            if name in self.constants.failed:
+                continue
+            try:
+                self.constants[name]
+            except (SyntaxError, ValueError) as error:
+                if not self.collect_errors:
+                    raise
+                self.errors.append(error)
+        return dict(self.constants)
 
-        text = text.replace("\n", "").strip()
+    # размер вывода: сколько узлов yaml получится при полном раскрытии ссылок и сколько среди них разных
+    def expansion_report(self, constants=None, top=5):
+        if constants is None:
+            constants = self.resolve()
+        expanded = {}  # id значения -> число узлов в раскрытом виде
+        unique = 0
 
-        current_def = None
-        current_value = ""
-        i = 0
-        depth = 0
+        def size(value):
+            nonlocal unique
+            if not isinstance(value, (dict, list)):
+                return 1
+            key = id(value)
+            if key not in expanded:
+                items = value.values() if isinstance(value, dict) else value
+                expanded[key] = 1 + len(value) * isinstance(value, dict) + sum(size(item) for item in items)
+                unique += 1 + len(value) * isinstance(value, dict) + sum(not isinstance(item, (dict, list)) for item in items)
+            return expanded[key]
 
-        while i < len(text): # идем посимвольно
-            char = text[i]
-
-            if char == '(' and text[i:i + 5] == '(def ':  # определение константы
-                # если определяется константа, когда другая не доопределена или присутствуют сторонние символы
-                if current_def or current_value.strip():
-                    raise SyntaxError("Invalid syntax")
-                i += 5
-                start = i
-                while text[i] != ' ':
-                    i += 1
-                current_def = text[start:i] # имя константы
-            elif char == 't' and text[i:i + 6] == 'table(':  # вложенный словарь
-                depth += 1
-                current_value += 'table('
-                i += 5
-            elif char == ')' and depth > 0:  # закончился вложенный словарь
-                depth -= 1
-                current_value += ')'
-            elif char == ')' and depth == 0 and not current_def:  # лишняя скобка
-                raise SyntaxError("Invalid syntax")
-            elif char == ')' and depth == 0:  # окончание значения константы
-                # end const
-                self.constants[current_def] = self.parse_value(current_value.strip())
-                current_def = None
-                current_value = ""
+        sizes = {name: size(value) for name, value in constants.items()}
+        scalars = sum(not isinstance(value, (dict, list)) for value in constants.values())
+        return {"expanded_nodes": sum(sizes.values()) + len(sizes), "unique_nodes": unique + scalars + len(sizes),
+                "largest": sorted(sizes.items(), key=lambda item: item[1], reverse=True)[:top]}
 
-            else:
-                current_value += char
-            i += 1
+    # константы в формате yaml; aliases - повторно используемые значения пишутся один раз с якорем
+    def dump(self, constants=None, aliases=False):
+        if constants is None:
+            constants = self.resolve()
+        if not aliases:
+            return yaml.dump(constants, Dumper=NoAliasDumper, default_flow_style=False, canonical=False)
+        names = {}
+        for name, value in constants.items():
+            names.setdefault(id(value), name)
+        dumper = type("AliasDumper", (AliasDumper,), {"anchor_names": names})
+        return yaml.dump(constants, Dumper=dumper, default_flow_style=False, canonical=False)
 
-        if current_def:  # если константа не доопределена
-            raise SyntaxError("Invalid syntax")
+    # потоковая обработка: каждая константа пишется в output, как только разобрано ее объявление;
+    # исходный текст целиком в памяти не держится, константы остаются для ссылок #[имя];
+    # уже выведенную константу не переписать, поэтому повторное объявление - ошибка
+    def stream_config(self, chunks, output):
+        self.redefine = False
+        self.lexer = Lexer()
+        self.tokens = self.lexer.stream_tokens(chunks)
+        self.advance()
+        for name in self.read_definitions():
+            output.write(self.dump({name: self.constants[name]}))
+            output.flush()
 
-        return yaml.dump(self.constants, Dumper=NoAliasDumper, default_flow_style=False, canonical=False)  # возвращаем в формате yaml
+    # путь к кэшу файла по хэшу его содержимого
+    def cache_path(self, content_hash):
+        return os.path.join(self.cache_dir, content_hash + ".pickle")
+
+    # загрузка разобранного файла из кэша, None если его нет или он другой версии
+    def load_cached(self, content_hash):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self.cache_path(content_hash), "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return None
+        if not isinstance(entry, dict) or entry.get("version") != self.CACHE_VERSION:
+            return None
+        return entry
+
+    # сохранение разобранного файла в кэш
+    def save_cached(self, content_hash, entry):
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.cache_path(content_hash)
+        with open(f"{path}.{os.getpid()}.tmp", "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{path}.{os.getpid()}.tmp", path)  # атомарная замена, чтобы не оставить битый кэш
+
+    # разбор одного файла на фоне констант предыдущих файлов
+    def compile_file(self, path, text):
+        parser = ConfigParser(self.collect_errors)
+        parser.constants = FileConstants(self.constants)
+        try:
+            parser.parse_config(text)
+        except (SyntaxError, ValueError) as error:
+            error.path = path
+            raise
+        for error in parser.errors:
+            error.path = path
+        self.errors.extend(parser.errors)
+        return dict(parser.constants), parser.constants.references
+
+    # загрузка нескольких файлов по порядку, константы предыдущих файлов видны в следующих;
+    # ключ файла - хэш содержимого и ключей файлов, откуда взяты его ссылки, поэтому файл
+    # разбирается заново, только если изменился он сам или константы, на которые он ссылается
+    def load_files(self, paths):
+        providers = {}  # имя константы -> ключ файла, в котором она определена
+        for path in paths:
+            with open(path, "rb") as f:
+                data = f.read()
+            content_hash = hashlib.sha256(data).hexdigest()
+            entry = self.load_cached(content_hash)
+            if entry is None or any(providers.get(name) != key for name, key in entry["references"].items()):
+                errors = len(self.errors)
+                constants, references = self.compile_file(path, data.decode("utf-8"))
+                references = {name: providers[name] for name in sorted(references)}
+                key_source = content_hash + "".join(f"|{name}={key}" for name, key in references.items())
+                entry = {"version": self.CACHE_VERSION, "key": hashlib.sha256(key_source.encode("utf-8")).hexdigest(),
+                         "references": references, "constants": constants}
+                if len(self.errors) == errors:  # файл с ошибками не кэшируем
+                    self.save_cached(content_hash, entry)
+            self.constants.update(entry["constants"])
+            for name in entry["constants"]:
+                providers[name] = entry["key"]
+        return self.constants
+
+    # обработка входных данных
+    def process_config(self, text):
+        self.parse_config(text)
+        return self.dump()  # возвращаем в формате yaml
 
 
 
 
 # пример использования
 if __name__ == "__main__":
-    input_text = ""
-    while True:
-        # получаем строку из потока стандартного ввода
-        line = input()
-        #print(line)
-        if not line:
-            break
-        input_text += line
-    parser = ConfigParser()
+    arg_parser = argparse.ArgumentParser(description="Перевод конфигурации в yaml")
+    arg_parser.add_argument("input", nargs="*",
+                            help="файлы с конфигурацией, константы файла видны в следующих, по умолчанию стандартный ввод")
+    arg_parser.add_argument("--stream", action="store_true",
+                            help="выводить каждую константу сразу после объявления, в порядке объявления; "
+                                 "повторно объявлять константы нельзя")
+    arg_parser.add_argument("--chunk-size", type=int, default=65536, help="размер читаемого куска в символах для --stream")
+    arg_parser.add_argument("--all-errors", action="store_true", help="вывести все ошибки, а не только первую")
+    arg_parser.add_argument("--cache-dir", help="каталог кэша разобранных файлов, неизменившиеся файлы не разбираются")
+    arg_parser.add_argument("--lazy", action="store_true",
+                            help="вычислять константы при обращении, разрешены ссылки на константы ниже")
+    arg_parser.add_argument("--aliases", action="store_true", help="писать повторяющиеся значения один раз через якоря yaml")
+    arg_parser.add_argument("--report", action="store_true", help="вывести размер раскрытого вывода перед ним")
+    args = arg_parser.parse_args()
+    if args.stream and (args.cache_dir or args.lazy or args.aliases or args.report):
+        arg_parser.error("--stream нельзя совмещать с --cache-dir, --lazy, --aliases и --report")
+    if args.cache_dir and args.lazy:
+        arg_parser.error("--lazy нельзя совмещать с --cache-dir: в кэше хранятся уже вычисленные константы")
+    if args.cache_dir and not args.input:
+        arg_parser.error("--cache-dir работает только с файлами, стандартный ввод не кэшируется")
+    parser = ConfigParser(collect_errors=args.all_errors, cache_dir=args.cache_dir, lazy=args.lazy)
+    path = None
     try:
-        result = parser.process_config(input_text)
-        print(result)
+        if not args.stream:  # файлы загружаются целиком, вывод в конце, как у process_config
+            if args.cache_dir:
+                parser.load_files(args.input)
+            else:
+                for path in args.input or [None]:
+                    errors = len(parser.errors)
+                    if path:
+                        with open(path, "r", encoding="utf-8") as f:
+                            parser.parse_config(f.read())
+                    else:
+                        parser.parse_config(sys.stdin.read())
+                    for error in parser.errors[errors:]:
+                        error.path = path
+            path = None
+            constants = parser.resolve()
+            if args.report:
+                report = parser.expansion_report(constants)
+                print(f"expansion: {report['expanded_nodes']} nodes written out, {report['unique_nodes']} distinct; largest: "
+                      + ", ".join(f"{name} {size}" for name, size in report["largest"]), file=sys.stderr)
+            sys.stdout.write(parser.dump(constants, aliases=args.aliases))
+        else:
+            for path in args.input or [None]:
+                errors = len(parser.errors)
+                source = open(path, "r", encoding="utf-8") if path else sys.stdin
+                # с терминала читаем по строкам, чтобы константа выводилась сразу после ввода объявления
+                if source.isatty():
+                    chunks = iter(source.readline, "")
+                else:
+                    chunks = iter(functools.partial(source.read, args.chunk_size), "")
+                try:
+                    parser.stream_config(chunks, sys.stdout)
+                finally:
+                    if source is not sys.stdin:
+                        source.close()
+                for error in parser.errors[errors:]:
+                    error.path = path
     except Exception as e:
-        print(f"Syntax error: {e}")
+        if not hasattr(e, "path"):
+            e.path = path
+        parser.errors.append(e)
+    for error in parser.errors:
+        prefix = f"{error.path}: " if getattr(error, "path", None) else ""
+        print(f"{prefix}Syntax error: {error}", file=sys.stderr)
+    if parser.errors:
+        sys.exit(1)
 
 
     # input_text = """
@@ -192,4 +590,4 @@ if __name__ == "__main__":
     #             skz => << 8, 1, >>,
     #         ) )
     #         (def const3 << table( key => 1, ), #[const1], 3, >> )
-    #         """
\ No newline at end of file
+    #         """
@@ -1,6 +1,10 @@
+import io
+import os
+import tempfile
 import unittest
+from unittest.mock import patch
 import yaml
-from homework3.src.ConfigParser import ConfigParser
+from homework3.src.ConfigParser import ConfigParser, Lexer
 
 class TestConfigParser(unittest.TestCase):
 
@@ -66,5 +70,161 @@ class TestConfigParser(unittest.TestCase):
         }
         self.assertEqual(yaml.safe_load(result), expected)
 
+    def test_lexer(self):
+        tokens = list(Lexer("(def a << 1, #[b] >>)").tokens())
+        self.assertEqual([kind for kind, _, _ in tokens],
+                         ["open", "name", "name", "open_array", "number", "comma", "const", "close_array", "close", "end"])
+        self.assertEqual(tokens[6], ("const", "#[b]", 13))
+
+    def test_nesting(self):
+        #глубокая вложенность разбирается за один проход
+        input_text = "(def const " + "<< table( key => " * 100 + "1" + " ) >>" * 100 + ")"
+        value = self.parser.parse_config(input_text)["const"]
+        for _ in range(100):
+            value = value[0]["key"]
+        self.assertEqual(value, 1)
+        with self.assertRaises(ValueError):
+            self.parser.process_config("(def const << 1, , 2 >>)")
+
+    def test_stream(self):
+        #куски режут лексемы и объявления в произвольных местах
+        input_text = """
+        (def const1 4)
+        (def const2 << 1, 22, #[const1], >> )
+        (def const3 table( key1 => #[const2], key2 => 333 ) )
+        """
+        expected = yaml.safe_load(ConfigParser().process_config(input_text))
+        for size in (1, 2, 3, 7, len(input_text)):
+            chunks = (input_text[i:i + size] for i in range(0, len(input_text), size))
+            output = io.StringIO()
+            ConfigParser().stream_config(chunks, output)
+            self.assertEqual(yaml.safe_load(output.getvalue()), expected)
+        with self.assertRaises(SyntaxError):
+            ConfigParser().stream_config(iter(["(def a 1) (def b", " 2"]), io.StringIO())
+        #повторное объявление дало бы повторяющийся ключ в yaml
+        output = io.StringIO()
+        with self.assertRaises(ValueError) as context:
+            ConfigParser().stream_config(iter(["(def a 1)\n(def b 2)\n(def a 5)\n"]), output)
+        self.assertEqual((context.exception.line, context.exception.column), (3, 6))
+        self.assertEqual(output.getvalue(), "a: 1\nb: 2\n")
+
+    def test_stream_incremental(self):
+        #константа выводится, как только закончено ее объявление, до чтения следующего куска
+        output = io.StringIO()
+        def chunks():
+            yield "(def a 1)\n"
+            self.assertEqual(output.getvalue(), "a: 1\n")
+            yield "(def b 2)\n"
+        ConfigParser().stream_config(chunks(), output)
+        self.assertEqual(output.getvalue(), "a: 1\nb: 2\n")
+
+    def test_error_position(self):
+        input_text = "(def a 1)\n(def b table(\n    x => 2,\n    y 3\n))\n"
+        with self.assertRaises(SyntaxError) as context:
+            self.parser.process_config(input_text)
+        self.assertEqual((context.exception.line, context.exception.column), (4, 7))
+        self.assertTrue(str(context.exception).endswith("\n        y 3\n          ^"))
+        #в потоковом режиме позиция и строка текста собираются по кускам
+        for size in (3, 4, 16):
+            chunks = (input_text[i:i + size] for i in range(0, len(input_text), size))
+            with self.assertRaises(SyntaxError) as context:
+                ConfigParser().stream_config(chunks, io.StringIO())
+            self.assertEqual((context.exception.line, context.exception.column), (4, 7))
+            self.assertTrue(str(context.exception).endswith("\n        y 3\n          ^"))
+        #повторное объявление, значение которого уходит в следующие куски, указывает на имя
+        redefined = "(def a 1)\n(def a\n  << 1, 2, 3, 4, 5, 6, 7, 8 >> )\n"
+        for size in (3, 4, 8, 16):
+            chunks = (redefined[i:i + size] for i in range(0, len(redefined), size))
+            with self.assertRaises(ValueError) as context:
+                ConfigParser().stream_config(chunks, io.StringIO())
+            self.assertEqual((context.exception.line, context.exception.column), (2, 6))
+            self.assertTrue(str(context.exception).endswith("\n    (def a\n         ^"))
+        long_line = "(def a 1)\n(def bb table( x => 2, yy 3 ))\n"
+        with self.assertRaises(SyntaxError) as context:
+            ConfigParser().stream_config(iter(long_line[i:i + 16] for i in range(0, len(long_line), 16)), io.StringIO())
+        self.assertTrue(str(context.exception).endswith(
+            "\n    (def bb table( x => 2, yy 3 ))\n                              ^"))
+        with self.assertRaises(ValueError) as context:
+            self.parser.process_config("(def a << 1,\n  #[b] >>)")
+        self.assertEqual((context.exception.line, context.exception.column), (2, 3))
+
+    def test_collect_errors(self):
+        parser = ConfigParser(collect_errors=True)
+        result = parser.parse_config("""
+        (def a 1)
+        (def b table( x => 2, y 3 ))
+        (def c << #[zz] >>)
+        (def d $)
+        (def e << #[a] >>)
+        """)
+        self.assertEqual(result, {"a": 1, "e": [1]})
+        self.assertEqual([(type(error), error.line) for error in parser.errors],
+                         [(SyntaxError, 3), (ValueError, 4), (ValueError, 5)])
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = [os.path.join(temp_dir, name) for name in ("a.conf", "b.conf", "c.conf")]
+            for path, text in zip(paths, ["(def a 1)", "(def b << #[a], 2 >>)", "(def c 3)"]):
+                with open(path, "w") as f:
+                    f.write(text)
+            cache_dir = os.path.join(temp_dir, "cache")
+            expected = {"a": 1, "b": [1, 2], "c": 3}
+            self.assertEqual(ConfigParser(cache_dir=cache_dir).load_files(paths), expected)
+            #неизменившиеся файлы не разбираются
+            with patch.object(ConfigParser, "compile_file", side_effect=AssertionError("parsed again")):
+                self.assertEqual(ConfigParser(cache_dir=cache_dir).load_files(paths), expected)
+            #изменился a: разбираются a и зависящий от него b, но не c
+            with open(paths[0], "w") as f:
+                f.write("(def a 5)")
+            with patch.object(ConfigParser, "compile_file", autospec=True, side_effect=ConfigParser.compile_file) as compile_file:
+                self.assertEqual(ConfigParser(cache_dir=cache_dir).load_files(paths), {"a": 5, "b": [5, 2], "c": 3})
+            self.assertEqual([call.args[1] for call in compile_file.call_args_list], paths[:2])
+            #кэш другой версии не используется
+            with patch.object(ConfigParser, "CACHE_VERSION", 2), \
+                    patch.object(ConfigParser, "compile_file", autospec=True, side_effect=ConfigParser.compile_file) as compile_file:
+                ConfigParser(cache_dir=cache_dir).load_files(paths)
+            self.assertEqual(compile_file.call_count, 3)
+
+    def test_lazy(self):
+        parser = ConfigParser(lazy=True)
+        constants = parser.parse_config("""
+        (def b << #[a], #[a] >>)
+        (def a table( x => << 1, 2 >> ))
+        (def broken << $ >>)
+        """)
+        #значение разбирается только при обращении, ошибка в broken не мешает b
+        self.assertEqual(constants["b"], [{"x": [1, 2]}, {"x": [1, 2]}])
+        self.assertEqual(set(dict(constants)), {"a", "b"})
+        with self.assertRaises(ValueError):
+            parser.resolve()
+        #повторное обращение к константе с ошибкой дает ту же ошибку
+        for _ in range(2):
+            with self.assertRaises(ValueError) as context:
+                constants["broken"]
+            self.assertIn("Invalid value: $", str(context.exception))
+        with self.assertRaises(ValueError) as context:
+            ConfigParser(lazy=True).process_config("(def a #[b])\n(def b << 1, #[a] >>)")
+        self.assertIn("Constant cycle: a -> b -> a", str(context.exception))
+        self.assertEqual((context.exception.line, context.exception.column), (2, 14))
+        #в режиме сбора ошибок разбор продолжается со следующего объявления
+        parser = ConfigParser(lazy=True, collect_errors=True)
+        parser.parse_config("(def a 1) (dex b 2) (def c << #[a] >>) (def d")
+        self.assertEqual(parser.resolve(), {"a": 1, "c": [1]})
+        self.assertEqual([type(error) for error in parser.errors], [SyntaxError, SyntaxError])
+
+    def test_aliases(self):
+        self.parser.parse_config("""
+        (def a table( x => << 1, 2 >> ))
+        (def b << #[a], #[a], #[a] >>)
+        (def c << #[b], #[b] >>)
+        """)
+        result = self.parser.dump(aliases=True)
+        self.assertEqual(result.count("x:"), 1)
+        self.assertIn("a: &a", result)
+        self.assertEqual(yaml.safe_load(result), yaml.safe_load(self.parser.dump()))
+        report = self.parser.expansion_report()
+        self.assertEqual((report["expanded_nodes"], report["unique_nodes"]), (57, 10))
+        self.assertEqual(report["largest"][0], ("c", 33))
+
 if __name__ == "__main__":
     unittest.main()